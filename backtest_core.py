@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+# numba 为可选依赖: 未安装时 njit 退化为空装饰器，记账改用 numpy 向量化实现
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
+
+
+@njit(cache=True)
+def _run_backtest_kernel(closes, amounts, out_invested, out_value, out_profit, out_return):
+    """
+    回测记账内核: 按日累计投入金额与持有份额，写出每日状态
+    :param closes: 每日收盘价
+    :param amounts: 每日投资金额 (<= 0 表示当天不投资)
+    :param out_*: 预分配的输出数组 (总投入, 市值, 收益, 收益率%)
+    """
+    total_invested = 0.0
+    total_shares = 0.0
+    for i in range(closes.shape[0]):
+        close_price = closes[i]
+        amount = amounts[i]
+        if amount > 0:
+            total_shares += amount / close_price
+            total_invested += amount
+
+        current_value = total_shares * close_price
+        profit = current_value - total_invested
+        out_invested[i] = total_invested
+        out_value[i] = current_value
+        out_profit[i] = profit
+        out_return[i] = (profit / total_invested * 100) if total_invested > 0 else 0.0
+
+
+def accumulate_positions(closes, amounts):
+    """
+    逐日累计投入金额与持有份额 (cumsum 按顺序累加，结果与逐日循环一致)
+    :param closes: 每日收盘价 (numpy 数组)
+    :param amounts: 每日投资金额 (numpy 数组, <= 0 表示当天不投资)
+    :return: (invest, shares, total_shares, total_invested) 当天投入、当天买入份额、累计份额、累计投入
+    """
+    invest = np.where(amounts > 0, amounts, 0.0)
+    shares = np.divide(invest, closes, out=np.zeros_like(invest), where=invest > 0)
+
+    # 累加始终使用 float64 (与内核一致)
+    total_shares = np.cumsum(shares, dtype=np.float64)
+    total_invested = np.cumsum(invest, dtype=np.float64)
+    return invest, shares, total_shares, total_invested
+
+
+def _run_backtest_numpy(closes, amounts):
+    """
+    回测记账的 numpy 向量化版本 (未安装 numba 时使用)，结果与内核逐日累计一致
+    """
+    _, _, total_shares, total_invested = accumulate_positions(closes, amounts)
+    final_value = total_shares * closes
+    profit = final_value - total_invested
+
+    return_rate = np.zeros_like(profit)
+    np.divide(profit, total_invested, out=return_rate, where=total_invested > 0)
+    return_rate *= 100
+
+    # 输出转换为输入精度
+    dtype = closes.dtype
+    return (total_invested.astype(dtype, copy=False), final_value.astype(dtype, copy=False),
+            profit.astype(dtype, copy=False), return_rate.astype(dtype, copy=False))
+
+
+def run_backtest_kernel(closes, amounts, dtype=np.float64):
+    """
+    对每日投资金额序列做回测记账
+    :param closes: 每日收盘价 (numpy 数组)
+    :param amounts: 每日投资金额 (numpy 数组, 与 closes 等长)
+    :param dtype: 计算与输出精度; np.float32 内存带宽减半，相对误差约 1e-7
+    :return: (total_invested, final_value, profit, return_rate) 四个 numpy 数组
+    """
+    closes = np.ascontiguousarray(closes, dtype=dtype)
+    amounts = np.ascontiguousarray(amounts, dtype=dtype)
+    if not HAS_NUMBA:
+        return _run_backtest_numpy(closes, amounts)
+
+    n = closes.shape[0]
+    total_invested = np.empty(n, dtype=dtype)
+    final_value = np.empty(n, dtype=dtype)
+    profit = np.empty(n, dtype=dtype)
+    return_rate = np.empty(n, dtype=dtype)
+    _run_backtest_kernel(closes, amounts, total_invested, final_value, profit, return_rate)
+    return total_invested, final_value, profit, return_rate
+
+def slice_date_range(df, start_dt, end_dt):
+    """
+    取出 [start_dt, end_dt] 区间内的数据 (重置索引)
+    缓存数据按日期升序: 二分查找区间边界，按位置切片，避免整表布尔掩码；未排序时退回掩码过滤
+    """
+    dates = df['date']
+    if dates.is_monotonic_increasing:
+        date_values = dates.to_numpy()
+        lo = np.searchsorted(date_values, pd.Timestamp(start_dt).to_datetime64(), side='left')
+        hi = np.searchsorted(date_values, pd.Timestamp(end_dt).to_datetime64(), side='right')
+        return df.iloc[lo:hi].reset_index(drop=True)
+
+    mask = (dates >= start_dt) & (dates <= end_dt)
+    return df.loc[mask].reset_index(drop=True)
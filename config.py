@@ -17,6 +17,12 @@ os.makedirs(RESULTS_DIR, exist_ok=True)
 CACHE_END_DATE = datetime.date.today().strftime('%Y%m%d')
 # CACHE_END_DATE = '20251231' # 固定截止日期示例
 
+# 本地缓存格式: 'parquet' (需要 pyarrow，未安装时自动退回 csv) 或 'csv'
+CACHE_FORMAT = 'parquet'
+
+# 行情数据是否压缩为 float32/小整数类型 (内存和缓存文件减半；价格存在约 1e-7 的相对误差，默认关闭)
+CACHE_DOWNCAST = False
+
 
 # ==========================================
 # 2. 回测参数配置 (Backtest Configuration)
@@ -45,6 +51,19 @@ START_DATE = "2019-01-18"
 END_DATE = "2026-01-16"
 
 
+# 回测记账精度: 'float64' (默认) 或 'float32'
+# float32 内存占用减半，累加仍按 float64 进行，输出的相对误差约 1e-7 (收益为差值，误差相应放大)
+BACKTEST_DTYPE = 'float64'
+
+# 多策略对比 (main_v3 / main_v4_plotly) 的进程数: 1 为顺序执行 (默认)
+# 内置策略已向量化，单个策略仅需几毫秒，进程池启动与数据传输的开销更大；大量逐日计算的自定义策略可设为 CPU 核数
+BACKTEST_MAX_WORKERS = 1
+
+# 交互式 HTML 图表 (main_v4_plotly) 中 plotly.js 的引入方式:
+# True 内嵌完整 plotly.js (约 3MB，可离线查看)；'cdn' 从 CDN 加载 (文件仅几十 KB，查看时需联网)
+PLOTLY_INCLUDE_JS = True
+
+
 # 2.2 策略选择
 # 选项: 'fixed' (普通定投), 'interval' (区间定投), 'profit_ratio' (获利比例策略), 'benchmark_drop' (标杆跌幅策略)
 # 动态标杆回撤策略参数 (当 STRATEGY_TYPE = 'dynamic_benchmark' 时生效)
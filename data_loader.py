@@ -1,98 +1,273 @@
 import os
+import numpy as np
 import pandas as pd
-import akshare as ak
 import config
 import datetime
+import json
+import threading
+import time
+import atexit
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# pyarrow 为可选依赖: 未安装时缓存退回 CSV
+try:
+    import pyarrow
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# 同一进程内，网络获取的结果在该时间 (秒) 内直接复用
+_FETCH_REUSE_SECONDS = 300
+
+# 进程内每种缓存最多保留的 DataFrame 数 (按最近使用淘汰)，web 等长时间运行的进程内存不会无限增长
+_MAX_CACHED_FRAMES = 32
+_memory_cache_lock = threading.Lock()
+
+def _cache_get(cache, key):
+    """
+    读取进程内 LRU 缓存，命中时标记为最近使用
+    """
+    with _memory_cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+def _cache_put(cache, key, value, ttl=None):
+    """
+    写入进程内 LRU 缓存，超过 _MAX_CACHED_FRAMES 时淘汰最久未使用的条目
+    :param ttl: 可选，value 为 (时间戳, 数据) 时顺带清除超过该秒数的过期条目
+    """
+    with _memory_cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        if ttl is not None:
+            now = time.time()
+            for k in [k for k, v in cache.items() if now - v[0] >= ttl]:
+                del cache[k]
+        while len(cache) > _MAX_CACHED_FRAMES:
+            cache.popitem(last=False)
+
+# 已解析的数据源类型缓存 {symbol: 'stock' | 'etf' | 'otc_fund' | 'index'}
+# 持久化到 DATA_DIR，下次获取时直接使用对应接口，不再依次试探前面的接口 (每次试探都是一次网络请求)
+_SOURCE_CACHE_FILENAME = '_source_cache.json'
+_source_cache = None
+_source_cache_lock = threading.Lock()
+
+def _source_cache_path():
+    return os.path.join(config.DATA_DIR, _SOURCE_CACHE_FILENAME)
+
+def _load_source_cache():
+    """
+    首次使用时从磁盘加载数据源缓存 (调用方需持有 _source_cache_lock，
+    避免多个线程各自加载并替换字典，丢失其他线程刚写入的条目)
+    """
+    global _source_cache
+    if _source_cache is None:
+        try:
+            with open(_source_cache_path(), 'r') as f:
+                _source_cache = json.load(f)
+        except (OSError, ValueError):
+            _source_cache = {}
+    return _source_cache
+
+def _get_cached_source(symbol):
+    with _source_cache_lock:
+        return _load_source_cache().get(symbol)
+
+def _set_cached_source(symbol, source_type):
+    # load_many 会在多个线程中同时写入
+    with _source_cache_lock:
+        if _load_source_cache().get(symbol) == source_type:
+            return
+        _source_cache[symbol] = source_type
+        # 先写临时文件再替换，其他进程不会读到写了一半的 JSON
+        path = _source_cache_path()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(_source_cache, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Failed to save data source cache: {e}")
+
+def _fetch_stock(symbol, start_date, end_date, adjust):
+    # A 股股票
+    import akshare as ak
+    try:
+        return ak.stock_zh_a_hist(symbol=symbol, period="daily", start_date=start_date, end_date=end_date, adjust=adjust)
+    except Exception:
+        return None
+
+def _fetch_etf(symbol, start_date, end_date, adjust):
+    # 场内ETF (以 51/15 开头通常为此类)
+    import akshare as ak
+    try:
+        return ak.fund_etf_hist_em(symbol=symbol, period="daily", start_date=start_date, end_date=end_date, adjust=adjust)
+    except Exception:
+        return None
+
+def _ensure_datetime(series):
+    """
+    转换为 datetime64，已经是 datetime64 时直接返回 (不复制)
+    接口返回的日期均为 ISO 格式 (YYYY-MM-DD)，指定格式跳过逐列的格式推断
+    """
+    return series if series.dtype.kind == 'M' else pd.to_datetime(series, format='ISO8601')
+
+# 场外基金净值历史 {symbol: (获取时间, DataFrame)}
+# 该接口总是返回全部历史，增量更新回退为全量获取时可直接复用同一份响应
+_fund_nav_cache = OrderedDict()
+
+def _fund_nav_history(symbol):
+    cached = _cache_get(_fund_nav_cache, symbol)
+    if cached is not None and time.time() - cached[0] < _FETCH_REUSE_SECONDS:
+        return cached[1]
+    import akshare as ak
+    df_fund = ak.fund_open_fund_net_value_em(symbol=symbol)
+    _cache_put(_fund_nav_cache, symbol, (time.time(), df_fund), ttl=_FETCH_REUSE_SECONDS)
+    return df_fund
+
+def _fetch_otc_fund(symbol, start_date, end_date, adjust):
+    # [新增] 场外基金(公募) (如 017641)
+    try:
+        # 接口：开放式基金-历史数据-东方财富
+        # 注意：该接口通常返回所有历史数据，不支持直接传 start/end 参数，需手动过滤
+        df_fund = _fund_nav_history(symbol)
+        
+        if df_fund.empty:
+            return None
+
+        # 场外基金数据结构不同，需要手动构造成 K线 格式以便兼容回测系统
+        # 使用 '累计净值' 作为 '收盘价'，因为它包含了分红收益，类似于复权价
+        # 如果 '累计净值' 为空，降级使用 '单位净值'
+        if '累计净值' in df_fund.columns:
+            price_col = '累计净值'
+        else:
+            price_col = '单位净值'
+        
+        # 筛选日期范围: 净值日期升序时二分查找区间边界，否则按 datetime64 比较
+        dates = _ensure_datetime(df_fund['净值日期'])
+        start_dt, end_dt = pd.to_datetime(start_date), pd.to_datetime(end_date)
+        if dates.is_monotonic_increasing:
+            selected = slice(dates.searchsorted(start_dt, side='left'), dates.searchsorted(end_dt, side='right'))
+        else:
+            selected = ((dates >= start_dt) & (dates <= end_dt)).to_numpy()
+        price = df_fund[price_col].iloc[selected]
+
+        # 构造标准列名 (模拟 A股接口的中文列名，以便利用下方的统一重命名逻辑)
+        return pd.DataFrame({
+            '日期': dates.iloc[selected],
+            '开盘': price,  # 基金一天只有一个价
+            '收盘': price,
+            '最高': price,
+            '最低': price,
+            '成交量': 0,    # 场外基金无成交量
+        })
+    except Exception as e:
+        # print(f"Debug: OTC Fund fetch failed: {e}")
+        return None
+
+def _fetch_index(symbol, start_date, end_date, adjust):
+    # 指数 (不支持复权)
+    import akshare as ak
+    try:
+        return ak.index_zh_a_hist(symbol=symbol, period="daily", start_date=start_date, end_date=end_date)
+    except Exception:
+        return None
+
+# AkShare 中文列名 -> 统一列名
+_COLUMN_MAP = {
+    "日期": "date",
+    "开盘": "open",
+    "收盘": "close",
+    "最高": "high",
+    "最低": "low",
+    "成交量": "volume",
+    "成交额": "amount",
+}
+# 保留的行情列 (按此顺序)
+_PRICE_COLS = ["date", "open", "close", "high", "low", "volume"]
+
+# 筹码分布 (CYQ) 中文列名 -> 统一列名
+_CYQ_MAP = {
+    '获利比例': 'profit_ratio',
+    '平均成本': 'avg_cost',
+    '90成本-低': 'cost90_low',
+    '90成本-高': 'cost90_high',
+    '90集中度': 'concentration90',
+    '70成本-低': 'cost70_low',
+    '70成本-高': 'cost70_high',
+    '70集中度': 'concentration70'
+}
+_CYQ_COLS = list(_CYQ_MAP.values())
+
+# 默认试探顺序: (数据源类型, 显示名称, 获取函数)
+_DATA_SOURCES = [
+    ('stock', 'Stock', _fetch_stock),
+    ('etf', 'ETF', _fetch_etf),
+    ('otc_fund', 'OTC Fund', _fetch_otc_fund),
+    ('index', 'Index', _fetch_index),
+]
+
+# 代码前缀可以确定类型的标的，优先使用对应接口 (其余代码如 000001 既可能是股票也可能是基金，保持默认顺序)
+_SOURCE_BY_PREFIX = {
+    '51': 'etf', '15': 'etf', '56': 'etf', '58': 'etf',   # 场内ETF
+    '399': 'index',                                       # 深证指数
+}
+# 按前缀长度 (长的优先) 截取代码查表，不逐个前缀比较
+_SOURCE_PREFIX_LENGTHS = sorted({len(p) for p in _SOURCE_BY_PREFIX}, reverse=True)
+
+def _guess_source_order(symbol, known_source=None):
+    """
+    数据源试探顺序: 已知数据源 -> 按代码前缀推断的数据源 -> 默认顺序
+    :return: _DATA_SOURCES 的重新排序
+    """
+    guessed = next((_SOURCE_BY_PREFIX[symbol[:n]] for n in _SOURCE_PREFIX_LENGTHS
+                    if symbol[:n] in _SOURCE_BY_PREFIX), None)
+    priority = [t for t in (known_source, guessed) if t is not None]
+    return sorted(_DATA_SOURCES, key=lambda source: priority.index(source[0]) if source[0] in priority else len(priority))
+
+# 与行情请求并发执行的辅助请求 (如筹码分布)
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='akshare-fetch')
 
 def fetch_data_from_akshare(symbol, start_date='19900101', end_date=config.CACHE_END_DATE, adjust='qfq'):
     """
     从 AkShare 获取数据。
     尝试顺序: A股股票 -> 场内ETF -> 场外基金(OTC) -> 指数
+    (已知数据源类型或可由代码前缀判断类型的标的，优先使用对应接口)
     
     :param symbol: 代码, e.g., '000001', '510300', '017641'
     :param adjust: 复权类型, 'qfq' (default), 'hfq', or '' (None)
     :return: DataFrame
     """
+    # akshare 导入耗时较长 (约 0.6 秒)，只在需要联网获取时导入，仅读取本地缓存时不加载
+    import akshare as ak
+
     # 清洗 symbol，移除后缀 (如 017641.OF -> 017641)
     clean_symbol = str(symbol).strip().split('.')[0]
     
     print(f"Fetching data for {clean_symbol} from AkShare (adjust={adjust})...")
     df = pd.DataFrame()
     data_source_type = None
-    
-    # =========================================================
-    # 1. 尝试作为 A 股股票获取
-    # =========================================================
-    try:
-        df = ak.stock_zh_a_hist(symbol=clean_symbol, period="daily", start_date=start_date, end_date=end_date, adjust=adjust)
-        if not df.empty:
-            print(f"Success: Found Stock data for {clean_symbol}")
-            data_source_type = 'stock'
-    except:
-        pass
 
-    # =========================================================
-    # 2. 尝试作为 场内ETF 获取 (以 51/15 开头通常为此类)
-    # =========================================================
-    if df.empty:
-        try:
-             df = ak.fund_etf_hist_em(symbol=clean_symbol, period="daily", start_date=start_date, end_date=end_date, adjust=adjust)
-             if not df.empty:
-                print(f"Success: Found ETF data for {clean_symbol}")
-                data_source_type = 'etf'
-        except:
-            pass
+    known_source = _get_cached_source(clean_symbol)
 
-    # =========================================================
-    # 3. [新增] 尝试作为 场外基金(公募) 获取 (如 017641)
-    # =========================================================
-    if df.empty:
-        try:
-            # 接口：开放式基金-历史数据-东方财富
-            # 注意：该接口通常返回所有历史数据，不支持直接传 start/end 参数，需手动过滤
-            df_fund = ak.fund_open_fund_net_value_em(symbol=clean_symbol)
-            
-            if not df_fund.empty:
-                # 场外基金数据结构不同，需要手动构造成 K线 格式以便兼容回测系统
-                # 使用 '累计净值' 作为 '收盘价'，因为它包含了分红收益，类似于复权价
-                # 如果 '累计净值' 为空，降级使用 '单位净值'
-                if '累计净值' in df_fund.columns:
-                    price_col = '累计净值'
-                else:
-                    price_col = '单位净值'
-                
-                # 构造标准列名 (模拟 A股接口的中文列名，以便利用下方的统一重命名逻辑)
-                df_fund['日期'] = df_fund['净值日期']
-                df_fund['收盘'] = df_fund[price_col]
-                df_fund['开盘'] = df_fund[price_col] # 基金一天只有一个价
-                df_fund['最高'] = df_fund[price_col]
-                df_fund['最低'] = df_fund[price_col]
-                df_fund['成交量'] = 0                # 场外基金无成交量
-                
-                # 筛选日期范围
-                df_fund['日期'] = pd.to_datetime(df_fund['日期']).dt.strftime('%Y-%m-%d')
-                mask = (df_fund['日期'] >= pd.to_datetime(start_date).strftime('%Y-%m-%d')) & \
-                       (df_fund['日期'] <= pd.to_datetime(end_date).strftime('%Y-%m-%d'))
-                df = df_fund.loc[mask].copy()
-                
-                if not df.empty:
-                    print(f"Success: Found OTC Fund data for {clean_symbol}")
-                    data_source_type = 'otc_fund'
-        except Exception as e:
-            # print(f"Debug: OTC Fund fetch failed: {e}")
-            pass
+    # 已知是股票时，筹码分布与行情并发获取 (其余标的需先确认是股票，避免无效请求)
+    cyq_future = None
+    if known_source == 'stock':
+        cyq_future = _fetch_pool.submit(ak.stock_cyq_em, symbol=clean_symbol, adjust=adjust)
 
-    # =========================================================
-    # 4. 尝试作为 指数 获取
-    # =========================================================
-    if df.empty:
-        try:
-            df = ak.index_zh_a_hist(symbol=clean_symbol, period="daily", start_date=start_date, end_date=end_date)
-            if not df.empty:
-                print(f"Success: Found Index data for {clean_symbol}")
-                data_source_type = 'index'
-        except:
-            pass
+    sources = _guess_source_order(clean_symbol, known_source)
+    for source_type, source_label, fetcher in sources:
+        df_source = fetcher(clean_symbol, start_date, end_date, adjust)
+        if df_source is not None and not df_source.empty:
+            print(f"Success: Found {source_label} data for {clean_symbol}")
+            df = df_source
+            data_source_type = source_type
+            _set_cached_source(clean_symbol, source_type)
+            break
 
     # =========================================================
     # 数据校验与清洗
@@ -101,73 +276,264 @@ def fetch_data_from_akshare(symbol, start_date='19900101', end_date=config.CACHE
         print(f"Warning: No data found for {clean_symbol} (checked Stock, ETF, OTC Fund, and Index)")
         return None
         
-    # 重命名列以统一格式
-    column_map = {
-        "日期": "date",
-        "开盘": "open",
-        "收盘": "close",
-        "最高": "high",
-        "最低": "low",
-        "成交量": "volume",
-        "成交额": "amount",
-    }
-    df.rename(columns=column_map, inplace=True)
-    
+    # 统一列名 -> 接口返回的列名 (中文列名或已是统一列名)
+    source_cols = {dst: src for src, dst in _COLUMN_MAP.items() if src in df.columns}
+    source_cols.update({c: c for c in _PRICE_COLS if c in df.columns})
+
     # 过滤并排序需要的列
-    needed_cols = ["date", "open", "close", "high", "low", "volume"]
-    available_cols = [c for c in needed_cols if c in df.columns]
+    available_cols = [c for c in _PRICE_COLS if c in source_cols]
     
     if not available_cols:
          print(f"Error: Data for {clean_symbol} missing required columns.")
          return None
 
-    df = df[available_cols]
+    # 直接按需要的列构造新表，不对整表重命名再切片
+    df = pd.DataFrame({c: df[source_cols[c]].to_numpy() for c in available_cols})
     
     # 确保 date 列是 datetime 类型
     if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'])
+        df['date'] = _ensure_datetime(df['date'])
 
     # =========================================================
-    # 5. 尝试获取筹码分布数据 (CYQ)
+    # 尝试获取筹码分布数据 (CYQ)
     # =========================================================
     # 仅针对 A 股股票有效
-    cyq_map = {
-        '获利比例': 'profit_ratio',
-        '平均成本': 'avg_cost',
-        '90成本-低': 'cost90_low',
-        '90成本-高': 'cost90_high',
-        '90集中度': 'concentration90',
-        '70成本-低': 'cost70_low',
-        '70成本-高': 'cost70_high',
-        '70集中度': 'concentration70'
-    }
-    
     # 只有股票才有筹码分布
     if data_source_type == 'stock':
         try:
-            df_cyq = ak.stock_cyq_em(symbol=clean_symbol, adjust=adjust)
+            df_cyq = cyq_future.result() if cyq_future is not None else ak.stock_cyq_em(symbol=clean_symbol, adjust=adjust)
             if df_cyq is not None and not df_cyq.empty:
                 # 统一日期列名
                 cyq_date_col = next((col for col in ['date', '日期'] if col in df_cyq.columns), None)
                 if cyq_date_col:
-                    df_cyq.rename(columns={cyq_date_col: 'date'}, inplace=True)
-                    df_cyq['date'] = pd.to_datetime(df_cyq['date'])
-                    
-                    df_cyq.rename(columns=cyq_map, inplace=True)
-                    cols_to_keep = ['date'] + [c for c in cyq_map.values() if c in df_cyq.columns]
-                    df_cyq = df_cyq[cols_to_keep]
-                    
-                    df = pd.merge(df, df_cyq, on='date', how='left')
+                    # 先选出需要的列再重命名，不处理接口返回的其余列
+                    wanted = [c for c in _CYQ_MAP if c in df_cyq.columns]
+                    df_cyq = df_cyq[[cyq_date_col] + wanted].rename(columns={cyq_date_col: 'date', **_CYQ_MAP})
+                    df_cyq['date'] = _ensure_datetime(df_cyq['date'])
+                    cols_to_keep = [_CYQ_MAP[c] for c in wanted]
+
+                    # 按日期对齐到行情数据 (行情按日期有序且唯一)，只复制 CYQ 列
+                    df_cyq = df_cyq.drop_duplicates(subset='date', keep='last').set_index('date')
+                    df_cyq = df_cyq.reindex(df['date'])
+                    for col in cols_to_keep:
+                        df[col] = df_cyq[col].to_numpy()
         except Exception as e:
             print(f"Warning: Failed to fetch/merge CYQ data: {e}")
 
-    # 填充缺失的 CYQ 列，保证 DataFrame 结构一致
-    for col in cyq_map.values():
-        if col not in df.columns:
-            df[col] = pd.NA
+    # 填充缺失的 CYQ 列 (NaN)，保证 DataFrame 结构一致
+    df = df.reindex(columns=list(df.columns) + [c for c in _CYQ_COLS if c not in df.columns])
+
+    if config.CACHE_DOWNCAST:
+        df = _downcast_numeric(df)
 
     return df
 
+def _downcast_numeric(df):
+    """
+    价格/筹码列转为 float32，成交量转为最小的整数类型
+    """
+    float_cols = [c for c in ['open', 'close', 'high', 'low'] + _CYQ_COLS if c in df.columns]
+    df = df.astype({c: 'float32' for c in float_cols})
+    if 'volume' in df.columns and df['volume'].dtype.kind in 'iu':
+        df['volume'] = pd.to_numeric(df['volume'], downcast='unsigned' if (df['volume'] >= 0).all() else 'integer')
+    return df
+
+def _cache_format():
+    """
+    实际使用的缓存格式 (parquet 需要 pyarrow)
+    """
+    if config.CACHE_FORMAT == 'parquet' and HAS_PYARROW:
+        return 'parquet'
+    return 'csv'
+
+# 进程内缓存 (加载结果只读共享，调用方不应原地修改；按最近使用淘汰，见 _MAX_CACHED_FRAMES):
+# _file_cache: 缓存文件路径 -> (修改时间, DataFrame)，文件未变化时不再重复解析
+# _fetch_cache: (缓存文件路径, end_date) -> (拉取时间, DataFrame)，短时间内不重复请求 AkShare，过期条目写入时清除
+_file_cache = OrderedDict()
+_fetch_cache = OrderedDict()
+
+def clear_cache():
+    """
+    清空进程内的数据缓存 (不删除磁盘上的缓存文件)，长时间运行的进程可用于释放内存
+    """
+    with _memory_cache_lock:
+        _file_cache.clear()
+        _fetch_cache.clear()
+        _fund_nav_cache.clear()
+
+def _read_csv(file_path):
+    """
+    读取 CSV 缓存。安装 pyarrow 时使用其多线程解析器
+    """
+    if not HAS_PYARROW:
+        return pd.read_csv(file_path, parse_dates=['date'], date_format='ISO8601')
+
+    df = pd.read_csv(file_path, parse_dates=['date'], engine='pyarrow')
+    # pyarrow 将全空列解析为 null 类型 (object)，统一为 float，与默认解析器一致
+    empty_cols = [c for c in df.columns if df[c].dtype == object and df[c].isna().all()]
+    return df.astype({c: 'float64' for c in empty_cols})
+
+def _read_cache(file_path):
+    mtime = os.path.getmtime(file_path)
+    cached = _cache_get(_file_cache, file_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    if file_path.endswith('.parquet'):
+        df = pd.read_parquet(file_path, engine='pyarrow')
+    else:
+        df = _read_csv(file_path)
+    _cache_put(_file_cache, file_path, (mtime, df))
+    return df
+
+def _write_cache(df, file_path):
+    # 行情列 (回测最常读取) 在前，CYQ 等其余列在后
+    hot_cols = [c for c in _PRICE_COLS if c in df.columns]
+    df = df[hot_cols + [c for c in df.columns if c not in hot_cols]]
+    if file_path.endswith('.parquet'):
+        # 全空的 CYQ 列 (pd.NA) 按 float 存储，读回时与 CSV 缓存一致
+        empty_cols = [c for c in df.columns if c != 'date' and df[c].isna().all()]
+        df = df.astype({c: 'float64' for c in empty_cols})
+        df.to_parquet(file_path, engine='pyarrow', compression='zstd', index=False)
+    else:
+        # 行情为日线数据，日期只写到天
+        df.to_csv(file_path, index=False, date_format='%Y-%m-%d')
+
+# 缓存文件在后台线程写入，load_data 无需等待写盘即可返回
+_io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-writer')
+atexit.register(_io_pool.shutdown, wait=True)
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+def _write_cache_task(df, file_path):
+    with _write_locks_guard:
+        lock = _write_locks.setdefault(file_path, threading.Lock())
+    with lock:
+        # 先写临时文件再原子替换，避免读到写了一半的缓存
+        # 锁只在本进程内有效，临时文件名带上 pid，多个进程同时写同一标的时互不覆盖
+        root, ext = os.path.splitext(file_path)
+        tmp_path = f"{root}.{os.getpid()}.tmp{ext}"
+        try:
+            _write_cache(df, tmp_path)
+            os.replace(tmp_path, file_path)
+            # 刚写入的文件无需再次解析
+            _cache_put(_file_cache, file_path, (os.path.getmtime(file_path), df))
+        except Exception as e:
+            print(f"Warning: Failed to save cache {file_path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+def _write_cache_async(df, file_path):
+    return _io_pool.submit(_write_cache_task, df, file_path)
+
+def _migrate_csv_cache(csv_path, file_path):
+    """
+    一次性迁移: 已有 CSV 缓存而无 Parquet 缓存时，转存为 Parquet 并删除 CSV
+    :return: 是否迁移成功
+    """
+    try:
+        df = _read_csv(csv_path)
+        _write_cache(df, file_path)
+        os.remove(csv_path)
+        print(f"Migrated cache {csv_path} -> {file_path}")
+        return True
+    except Exception as e:
+        print(f"Warning: Failed to migrate cache {csv_path}: {e}")
+        return False
+
+def migrate_csv_caches():
+    """
+    将 DATA_DIR 下所有 CSV 行情缓存一次性转存为 Parquet (需要 pyarrow)
+    load_data 也会在首次读取某个标的时自动迁移，此函数用于批量预先转换
+    :return: 迁移的文件数
+    """
+    if _cache_format() != 'parquet':
+        print("Parquet cache is disabled or pyarrow is not installed. Nothing to migrate.")
+        return 0
+
+    migrated = 0
+    for filename in sorted(os.listdir(config.DATA_DIR)):
+        # 行情缓存文件名形如 {symbol}_{adjust}.csv (adjust 可能为空)，跳过正在写入的临时文件 ({symbol}_{adjust}.{pid}.tmp.csv)
+        if not filename.endswith('.csv') or '_' not in filename or filename.endswith('.tmp.csv'):
+            continue
+        csv_path = os.path.join(config.DATA_DIR, filename)
+        file_path = csv_path[:-len('.csv')] + '.parquet'
+        if not os.path.exists(file_path) and _migrate_csv_cache(csv_path, file_path):
+            migrated += 1
+    return migrated
+
+# 交易时段 (盘前截止 / 收盘数据更新截止)
+_MARKET_OPEN = datetime.time(9, 15)
+_MARKET_CUTOFF = datetime.time(15, 10)
+
+@functools.lru_cache(maxsize=64)
+def _request_date(end_date):
+    """
+    请求结束日期 -> datetime.date (同一结束日期在批量加载时反复出现，只解析一次)
+    """
+    return pd.Timestamp(end_date).date()
+
+def _cache_needs_update(cached_last_date, end_date, now_dt=None):
+    """
+    缓存时效检查
+    :param cached_last_date: 缓存最后一天 (datetime.date)
+    :param end_date: 请求的结束日期 (字符串/Timestamp/date)
+    :param now_dt: 当前时间，批量检查时可由调用方统一传入
+    :return: 是否需要更新
+    """
+    request_end_date = _request_date(end_date)
+    
+    # Current time check for intraday updates
+    if now_dt is None:
+        now_dt = datetime.datetime.now()
+    current_date = now_dt.date()
+    current_time = now_dt.time()
+
+    # 1. 缓存是否过期: 缓存早于请求结束日期，且不属于 "盘前缓存为昨天" 的情况；
+    #    请求结束日期在未来时，缓存早于今天即过期
+    is_pre_market = current_time < _MARKET_OPEN
+    is_cache_yesterday = (current_date - cached_last_date).days == 1
+    expired = cached_last_date < request_end_date and (
+        not (is_pre_market and is_cache_yesterday) if request_end_date <= current_date
+        else cached_last_date < current_date
+    )
+
+    # 2. 盘中强制刷新 (请求日期是今天且时间未到收盘): 缓存即使包含今天，也可能是盘中的旧数据
+    #    场外基金通常晚上才更新净值，盘中更新没用，但为了通用性暂且保留
+    intraday = current_date == request_end_date and _MARKET_OPEN < current_time < _MARKET_CUTOFF
+
+    if expired:
+        print(f"Cache expired (Last: {cached_last_date}). Updating...")
+    elif intraday:
+        print(f"Intraday update triggered. Updating...")
+    return expired or intraday
+
+def _merge_incremental(df_cached, df_new):
+    """
+    将增量获取的数据合并到本地缓存
+    前复权价格在分红除权后会整体变化: 重叠区间 (不含缓存最后一天) 的收盘价不一致，或列不一致时返回 None，由调用方重新获取全部历史
+    :return: 合并后的 DataFrame 或 None
+    """
+    if df_new is None or df_new.empty or set(df_new.columns) != set(df_cached.columns):
+        return None
+
+    # 缓存最后一行可能是盘中获取的临时数据 (收盘价与最终值不同)，不参与校验，由 df_new 覆盖
+    cached_last_date = df_cached['date'].iat[-1]
+    overlap = df_cached[['date', 'close']].merge(df_new[['date', 'close']], on='date')
+    overlap = overlap[overlap['date'] < cached_last_date]
+    if overlap.empty or not np.allclose(overlap['close_x'].to_numpy(dtype=float),
+                                        overlap['close_y'].to_numpy(dtype=float), rtol=1e-6):
+        return None
+
+    df = pd.concat([df_cached, df_new[df_cached.columns]], ignore_index=True)
+    df = df[~df['date'].duplicated(keep='last')]
+    # 两段数据各自有序，去重后通常已按日期排序，仅在必要时排序
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date', kind='stable')
+    return df.reset_index(drop=True)
+
 def load_data(symbol, start_date='19900101', end_date=None, adjust='qfq', force_update=False):
     """
     加载数据。如果本地存在则读取，否则从网络获取并保存。
@@ -176,61 +542,50 @@ def load_data(symbol, start_date='19900101', end_date=None, adjust='qfq', force_
     if end_date is None:
         end_date = config.CACHE_END_DATE
 
-    # 保证缓存文件名为纯数字 (e.g. 017641_qfq.csv)
+    # 保证缓存文件名为纯数字 (e.g. 017641_qfq.parquet)
     clean_symbol = str(symbol).strip().split('.')[0]
-    filename = f"{clean_symbol}_{adjust}.csv"
+    cache_format = _cache_format()
+    filename = f"{clean_symbol}_{adjust}.{cache_format}"
     file_path = os.path.join(config.DATA_DIR, filename)
+
+    if cache_format == 'parquet':
+        csv_path = os.path.join(config.DATA_DIR, f"{clean_symbol}_{adjust}.csv")
+        if os.path.exists(csv_path) and not os.path.exists(file_path):
+            _migrate_csv_cache(csv_path, file_path)
+
+    # 本进程刚从网络拉取过 (如多策略对比、盘中刷新)，直接复用，避免重复请求
+    fetch_key = (file_path, str(end_date))
+    if force_update:
+        with _memory_cache_lock:
+            _fetch_cache.pop(fetch_key, None)
+    else:
+        fetched = _cache_get(_fetch_cache, fetch_key)
+        if fetched is not None and time.time() - fetched[0] < _FETCH_REUSE_SECONDS:
+            return fetched[1]
     
+    # 可用于增量更新的本地缓存
+    df_cached = None
+
     # Check if cache exists
     if os.path.exists(file_path) and not force_update:
         try:
-            df = pd.read_csv(file_path, parse_dates=['date'])
+            df = _read_cache(file_path)
             
             # --- Cache Validation Logic ---
             if not df.empty and 'date' in df.columns:
-                cached_last_date = df['date'].iloc[-1].date()
-                request_end_date = pd.to_datetime(end_date).date()
-                
-                # Current time check for intraday updates
-                current_dt = datetime.datetime.now()
-                current_date = current_dt.date()
-                current_time = current_dt.time()
-                cutoff_time = datetime.time(15, 10) 
-
-                needs_update = False
-
-                # 1. 检查缓存是否过期
-                if cached_last_date < request_end_date:
-                    if request_end_date <= current_date:
-                         # 盘前且缓存是昨天的，无需更新
-                         is_pre_market = current_time < datetime.time(9, 15)
-                         is_cache_yesterday = (current_date - cached_last_date).days == 1
-
-                         if is_pre_market and is_cache_yesterday:
-                             needs_update = False
-                         else:
-                             print(f"Cache expired (Last: {cached_last_date}). Updating...")
-                             needs_update = True
-                    elif cached_last_date < current_date:
-                        print(f"Cache older than today. Updating...")
-                        needs_update = True
-
-                # 2. 盘中强制刷新检查 (如果在交易日且时间未到收盘，且请求日期是今天)
-                # 修正：如果本地缓存已经包含今天，但现在是盘中，可能是旧数据，也需要刷新
-                start_time = datetime.time(9, 15)
-                if current_date == request_end_date and start_time < current_time < cutoff_time:
-                     # 只有当请求的是股票/ETF时，盘中更新才有意义
-                     # 场外基金通常晚上才更新净值，盘中更新没用，但为了通用性暂且保留
-                    print(f"Intraday update triggered. Updating...")
-                    needs_update = True
+                needs_update = _cache_needs_update(df['date'].iat[-1].date(), end_date)
 
-                # 3. 策略字段完整性检查
+                # 策略字段完整性检查
                 if config.STRATEGY_TYPE == 'profit_ratio' and 'profit_ratio' not in df.columns:
                     print(f"Strategy requirement missing (profit_ratio). Updating...")
                     needs_update = True
 
                 if not needs_update:
                     return df
+
+                # 缓存列完整时只需补齐最近的数据
+                if 'profit_ratio' in df.columns or config.STRATEGY_TYPE != 'profit_ratio':
+                    df_cached = df
             else:
                  needs_update = True
 
@@ -241,16 +596,49 @@ def load_data(symbol, start_date='19900101', end_date=None, adjust='qfq', force_
         needs_update = True
     
     if needs_update:
-        # Fetch from network (Always use clean_symbol)
-        fetch_start_date = '19900101'
-        df = fetch_data_from_akshare(clean_symbol, start_date=fetch_start_date, end_date=end_date, adjust=adjust)
+        df = None
+        if df_cached is not None:
+            # 增量更新: 从缓存最后一天的前 7 天开始获取，与缓存合并
+            fetch_start_date = (df_cached['date'].iat[-1] - datetime.timedelta(days=7)).strftime('%Y%m%d')
+            df_new = fetch_data_from_akshare(clean_symbol, start_date=fetch_start_date, end_date=end_date, adjust=adjust)
+            df = _merge_incremental(df_cached, df_new)
+            if df is None:
+                print(f"Incremental update not applicable for {clean_symbol}. Fetching full history...")
+
+        if df is None:
+            # Fetch from network (Always use clean_symbol)
+            fetch_start_date = '19900101'
+            df = fetch_data_from_akshare(clean_symbol, start_date=fetch_start_date, end_date=end_date, adjust=adjust)
         
         if df is not None and not df.empty:
             print(f"Saving data for {clean_symbol} to {file_path}...")
-            # 存盘前确保日期格式统一
-            df.to_csv(file_path, index=False)
+            _write_cache_async(df, file_path)
+            _cache_put(_fetch_cache, fetch_key, (time.time(), df), ttl=_FETCH_REUSE_SECONDS)
             return df
         else:
             return None
     
-    return None
\ No newline at end of file
+    return None
+
+def load_many(symbols, adjust='qfq', max_workers=10):
+    """
+    并发加载多个标的。数据获取以网络 IO 为主，使用线程池并行，每个标的仍走 load_data 的缓存校验逻辑。
+    :param symbols: 标的代码列表
+    :param max_workers: 线程数 (注意 AkShare 数据源的访问频率限制)
+    :return: dict {symbol: DataFrame or None}，顺序与 symbols 一致
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols))) as executor:
+        futures = [(symbol, executor.submit(load_data, symbol, adjust=adjust)) for symbol in symbols]
+
+        results = {}
+        for symbol, future in futures:
+            try:
+                results[symbol] = future.result()
+            except Exception as e:
+                print(f"Error loading data for {symbol}: {e}")
+                results[symbol] = None
+    return results
@@ -0,0 +1,45 @@
+import hashlib
+import os
+import numpy as np
+
+# 图表文件旁记录绘图输入的哈希 (<图表文件>.sha)，输入未变化时跳过重新绘制与保存
+# 哈希包含绘图脚本的样式版本 (各脚本的 PLOT_VERSION)，修改绘图样式时递增版本即可使已有图表重新生成
+
+def figure_key(version, *parts):
+    """
+    计算绘图输入的内容哈希
+    :param version: 绘图样式版本 (如 'main_v3.plot_comparison/2')
+    :param parts: 标题、名称等普通值或 numpy 数组 (数组按字节参与计算)
+    :return: 十六进制字符串
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for part in (version,) + parts:
+        if isinstance(part, np.ndarray):
+            h.update(str(part.dtype).encode())
+            h.update(np.ascontiguousarray(part).tobytes())
+        else:
+            h.update(repr(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+def is_up_to_date(filepath, key):
+    """
+    图表文件存在且记录的哈希与 key 一致时返回 True
+    """
+    if not os.path.exists(filepath):
+        return False
+    try:
+        with open(filepath + '.sha', 'r') as f:
+            return f.read().strip() == key
+    except OSError:
+        return False
+
+def mark_saved(filepath, key):
+    """
+    图表保存成功后记录对应的哈希
+    """
+    try:
+        with open(filepath + '.sha', 'w') as f:
+            f.write(key)
+    except OSError as e:
+        print(f"Warning: Failed to save figure hash: {e}")
@@ -1,9 +1,66 @@
+import numpy as np
 import pandas as pd
 import data_loader
 import strategies
+import backtest_core
+from summary import calc_annualized_return
 import config
 import os
 import sys
+import csv
+from pathlib import Path
+
+# 回测结果报告模板
+_RESULT_TEMPLATE = """
+==================================================
+Backtest Result for {symbol}
+Strategy: {strategy_name}
+--------------------------------------------------
+Start Date: {start:%Y-%m-%d}
+End Date:   {end:%Y-%m-%d}
+Duration:   {months:.1f} months
+Start Price: {start_price:.2f}
+End Price:   {final_price:.2f}
+--------------------------------------------------
+Total Invested: {total_invested:.2f}
+Final Value:    {final_value:.2f}
+Profit:         {profit:.2f}
+Return Rate:    {return_rate:.2f}%
+Annualized:     {annualized_return:.2f}% (CAGR)
+==================================================
+"""
+
+# 交易日志行数少于该值时使用标准库 csv 写出，跳过 pandas 的序列化开销
+_SMALL_LOG_ROWS = 1024
+
+def _save_logs(logs, log_path):
+    """
+    保存交易日志 CSV，输出格式与 DataFrame.to_csv(index=False) 一致
+    :param logs: dict {列名: numpy 数组}，第一列为日期
+    """
+    n = len(logs['date'])
+    if n >= _SMALL_LOG_ROWS:
+        pd.DataFrame(logs).to_csv(log_path, index=False)
+        return
+
+    columns = [np.datetime_as_string(logs['date'], unit='D').tolist()]
+    for col, values in logs.items():
+        if col == 'date':
+            continue
+        if (values.dtype.kind == 'f' and values.dtype != np.float64) or values.dtype == object:
+            # float32 等 (CACHE_DOWNCAST) 按自身精度的最短表示输出 (如 0.1 而非 0.10000000149011612)；
+            # object 列 (如外部传入 df 的 CYQ 列) 中的 numpy 标量同样按 str 输出，与 pandas 一致
+            items = [str(v) for v in values]
+        else:
+            items = values.tolist()
+        # 与 pandas 一致: 缺失值 (NaN / None / pd.NA) 写为空，在原始数组上判断
+        missing = pd.isna(values).tolist()
+        columns.append(['' if m else v for v, m in zip(items, missing)])
+
+    with open(log_path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(logs.keys())
+        writer.writerows(zip(*columns))
 
 def run_backtest(symbol, start_date, end_date, strategy, strategy_name="Custom Strategy", df=None):
     """
@@ -32,118 +89,104 @@ def run_backtest(symbol, start_date, end_date, strategy, strategy_name="Custom S
         print(f"Error parsing dates: {e}")
         return None
     
-    mask = (df['date'] >= start_dt) & (df['date'] <= end_dt)
-    df_backtest = df.loc[mask].reset_index(drop=True)
+    df_backtest = backtest_core.slice_date_range(df, start_dt, end_dt)
     
     if df_backtest.empty:
         print(f"No data in range {start_date} to {end_date} for {symbol}")
         return None
 
-    # 3. 回测循环
-    total_invested = 0.0
-    total_shares = 0.0
-    logs = []
+    # 3. 回测
+    n = len(df_backtest)
+    closes = df_backtest['close'].to_numpy(dtype=np.float64)
+
+    # 历史数据视图: 每天只移动下标，不再对 DataFrame 切片
+    history = strategies.HistoryView(df_backtest)
 
     print(f"Starting backtest for {symbol} ({strategy_name}) from {start_date} to {end_date}...")
     
-    for i in range(len(df_backtest)):
-        current_row = df_backtest.iloc[i]
-        current_date = current_row['date']
-        close_price = current_row['close']
-        
-        # 传递历史数据子集
-        history_subset = df_backtest.iloc[:i+1]
-        
-        amount = strategy.get_investment_amount(history_subset, current_date)
-        
-        if amount > 0:
-            shares = amount / close_price
-            total_shares += shares
-            total_invested += amount
-            # 构建日志记录
-            log_item = {
-                'date': current_date,
-                'price': close_price,
-                'invest_amount': amount,
-                'shares_bought': shares,
-                'total_shares': total_shares,
-                'total_invested': total_invested
-            }
-            
-            # 如果数据中有策略相关的新列，也保存到日志中
-            for col in ['profit_ratio', 'avg_cost', 'cost90_low', 'cost90_high', 'concentration90']:
-                if col in current_row:
-                    log_item[col] = current_row[col]
-            
-            logs.append(log_item)
+    # 先一次性计算每天的投资金额 (内置策略为向量化实现，不再逐日调用策略)
+    history.advance(n - 1)
+    amounts = np.asarray(strategy.get_investment_amounts(history), dtype=np.float64)
+
+    # 逐日累计份额与投入 (与 main_v2 共用 backtest_core 的记账逻辑)
+    invest_amount_arr, shares_bought_arr, total_shares_arr, total_invested_arr = \
+        backtest_core.accumulate_positions(closes, amounts)
+    total_shares = total_shares_arr[-1]
+    total_invested = total_invested_arr[-1]
+
+    # 构建交易日志 (仅保留有投资的交易日)
+    traded = invest_amount_arr > 0
+    logs = {
+        'date': df_backtest['date'].to_numpy()[traded],
+        'price': closes[traded],
+        'invest_amount': invest_amount_arr[traded],
+        'shares_bought': shares_bought_arr[traded],
+        'total_shares': total_shares_arr[traded],
+        'total_invested': total_invested_arr[traded]
+    }
+
+    # 如果数据中有策略相关的新列，也保存到日志中
+    for col in ['profit_ratio', 'avg_cost', 'cost90_low', 'cost90_high', 'concentration90']:
+        if col in df_backtest.columns:
+            logs[col] = df_backtest[col].to_numpy()[traded]
 
     # 4. 结算
     if total_shares == 0:
         print("No investment made during this period.")
+        zero = np.float64(0.0)
         return {
-            'total_invested': 0,
-            'final_value': 0,
-            'profit': 0,
-            'return_rate': 0
+            'total_invested': zero,
+            'final_value': zero,
+            'profit': zero,
+            'return_rate': zero,
+            'annualized_return': zero
         }
 
-    final_price = df_backtest.iloc[-1]['close']
+    final_price = df_backtest['close'].iat[-1]
     final_value = total_shares * final_price
     profit = final_value - total_invested
     return_rate = (profit / total_invested) * 100
 
     # 计算时长 (天/月)
-    days = (df_backtest.iloc[-1]['date'] - df_backtest.iloc[0]['date']).days
+    days = (df_backtest['date'].iat[-1] - df_backtest['date'].iat[0]).days
     months = days / 30.0 # 近似
     
     # 计算年化收益率 (CAGR)
-    annualized_return = 0.0
-    if days > 0:
-        years = days / 365.0
-        # 使用复利公式: (Final / Invested) ^ (1/Years) - 1
-        # 注意: 这假设是一次性投入的 CAGR，对于定投仅供参考
-        if total_invested > 0 and final_value > 0:
-            try:
-                annualized_return = ((final_value / total_invested) ** (1 / years) - 1) * 100
-            except:
-                annualized_return = 0.0
+    # 使用复利公式: (Final / Invested) ^ (1/Years) - 1
+    # 注意: 这假设是一次性投入的 CAGR，对于定投仅供参考
+    annualized_return = np.float64(calc_annualized_return(total_invested, final_value, days / 365.0))
 
     # 5. 输出结果
-    result_str = f"""
-==================================================
-Backtest Result for {symbol}
-Strategy: {strategy_name}
---------------------------------------------------
-Start Date: {df_backtest.iloc[0]['date'].strftime('%Y-%m-%d')}
-End Date:   {df_backtest.iloc[-1]['date'].strftime('%Y-%m-%d')}
-Duration:   {months:.1f} months
-Start Price: {df_backtest.iloc[0]['close']:.2f}
-End Price:   {final_price:.2f}
---------------------------------------------------
-Total Invested: {total_invested:.2f}
-Final Value:    {final_value:.2f}
-Profit:         {profit:.2f}
-Return Rate:    {return_rate:.2f}%
-Annualized:     {annualized_return:.2f}% (CAGR)
-==================================================
-"""
+    result_str = _RESULT_TEMPLATE.format(
+        symbol=symbol,
+        strategy_name=strategy_name,
+        start=df_backtest['date'].iat[0],
+        end=df_backtest['date'].iat[-1],
+        months=months,
+        start_price=df_backtest['close'].iat[0],
+        final_price=final_price,
+        total_invested=total_invested,
+        final_value=final_value,
+        profit=profit,
+        return_rate=return_rate,
+        annualized_return=annualized_return
+    )
     print(result_str)
     
     # 保存结果到文件
     filename = f"{symbol}_{strategy_name}_{start_date}_{end_date}.txt".replace(' ', '_').replace(':', '')
     filepath = os.path.join(config.RESULTS_DIR, filename)
-    with open(filepath, 'w') as f:
-        f.write(result_str)
+    Path(filepath).write_text(result_str, encoding='utf-8')
     
     print(f"Result saved to {filepath}")
     
     # 保存详细交易日志
-    log_df = pd.DataFrame(logs)
-    if not log_df.empty:
+    if len(logs['date']) > 0:
         log_path = os.path.join(config.RESULTS_DIR, filename.replace('.txt', '_details.csv'))
-        log_df.to_csv(log_path, index=False)
+        _save_logs(logs, log_path)
         print(f"Details saved to {log_path}")
         
+    # 结果均为 np.float64，多次回测的结果可直接 pd.DataFrame(list_of_results) 汇总
     return {
         'total_invested': total_invested,
         'final_value': final_value,
@@ -161,56 +204,11 @@ def main():
     end_date = config.END_DATE
     strategy_type = config.STRATEGY_TYPE
     
-    strategy = None
-    strategy_name = ""
-    
-    if strategy_type == 'fixed':
-        params = config.FIXED_STRATEGY_PARAMS
-        strategy = strategies.FixedInvestment(amount=params['amount'], freq=params['freq'])
-        strategy_name = f"Fixed_{params['freq']}_{params['amount']}"
-        
-    elif strategy_type == 'interval':
-        params = config.INTERVAL_STRATEGY_PARAMS
-        strategy = strategies.IntervalFixedInvestment(intervals=params)
-        strategy_name = "Interval_Custom"
-        
-    elif strategy_type == 'profit_ratio':
-        params = config.PROFIT_RATIO_STRATEGY_PARAMS
-        strategy = strategies.ProfitRatioStrategy(base_amount=params['base_amount'], thresholds=params['thresholds'])
-        strategy_name = "Profit_Ratio_Dynamic"
-
-    elif strategy_type == 'benchmark_drop':
-        params = config.BENCHMARK_DROP_STRATEGY_PARAMS
-        strategy = strategies.BenchmarkDropStrategy(
-            base_amount=params['base_amount'],
-            freq=params['freq'],
-            scale_factor=params['scale_factor']
-        )
-        strategy_name = f"BenchmarkDrop_{params['freq']}_x{params['scale_factor']}"
-
-    elif strategy_type == 'dynamic_benchmark':
-        params = config.DYNAMIC_BENCHMARK_STRATEGY_PARAMS
-        strategy = strategies.DynamicBenchmarkDropStrategy(
-            base_amount=params['base_amount'],
-            freq=params['freq'],
-            benchmark_type=params['benchmark_type'],
-            thresholds=params['thresholds']
-        )
-        strategy_name = f"DynamicBenchmark_{params['benchmark_type']}"
-
-    elif strategy_type == 'quadratic_ma':
-        params = config.QUADRATIC_MA_STRATEGY_PARAMS
-        strategy = strategies.QuadraticMAStrategy(
-            base_amount=params['base_amount'],
-            freq=params['freq'],
-            k_factor=params['k_factor'],
-            max_multiplier=params['max_multiplier']
-        )
-        strategy_name = f"QuadraticMA_K{params['k_factor']}"
-
-    else:
+    builder = strategies.STRATEGY_BUILDERS.get(strategy_type)
+    if builder is None:
         print(f"Error: Unknown strategy type '{strategy_type}' in config.py")
         sys.exit(1)
+    strategy, strategy_name = builder(config)
         
     # Run the backtest
     run_backtest(symbol, start_date, end_date, strategy, strategy_name)
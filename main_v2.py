@@ -1,21 +1,24 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 import data_loader
 import strategies
 import config
+import backtest_core
+import figure_cache
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
 
-def run_backtest_v2(symbol, start_date, end_date, strategy, strategy_name="Custom Strategy"):
-    # 1. 加载数据
-    df = data_loader.load_data(symbol)
-    
-    if df is None:
-        print(f"Failed to load data for {symbol}")
-        return None
+# 绘图样式版本 (参与图表缓存哈希)，修改绘图代码时递增，使已生成的图表重新绘制
+PLOT_VERSION = 1
 
-    # 2. 过滤时间区间
+def prepare_backtest_frame(df, start_date, end_date):
+    """
+    按时间区间过滤数据并构造 HistoryView。
+    日期解析、区间过滤、列转换为 numpy 以及 MA250 等滚动指标的缓存只做一次，
+    多策略对比时可在所有策略间复用。
+    :return: HistoryView，日期无法解析或区间内无数据时返回 None
+    """
     try:
         start_dt = pd.to_datetime(start_date)
         end_dt = pd.to_datetime(end_date)
@@ -23,136 +26,182 @@ def run_backtest_v2(symbol, start_date, end_date, strategy, strategy_name="Custo
         print(f"Error parsing dates: {e}")
         return None
     
-    mask = (df['date'] >= start_dt) & (df['date'] <= end_dt)
-    df_backtest = df.loc[mask].reset_index(drop=True)
+    df_backtest = backtest_core.slice_date_range(df, start_dt, end_dt)
     
     if df_backtest.empty:
-        print(f"No data in range {start_date} to {end_date} for {symbol}")
         return None
 
-    # 3. 回测循环
-    total_invested = 0.0
-    total_shares = 0.0
-    daily_records = []
+    return strategies.HistoryView(df_backtest)
 
-    print(f"Starting backtest for {symbol} ({strategy_name}) from {start_date} to {end_date}...")
-    
-    # 记录实际回测开始的日期
-    actual_start_date = df_backtest.iloc[0]['date']
-    
-    for i in range(len(df_backtest)):
-        current_row = df_backtest.iloc[i]
-        current_date = current_row['date']
-        close_price = current_row['close']
-        
-        # 传递历史数据子集
-        history_subset = df_backtest.iloc[:i+1]
-        
-        amount = strategy.get_investment_amount(history_subset, current_date)
-        
-        if amount > 0:
-            shares = amount / close_price
-            total_shares += shares
-            total_invested += amount
-            
-        # 记录每日状态
-        current_value = total_shares * close_price
-        profit = current_value - total_invested
-        return_rate = (profit / total_invested * 100) if total_invested > 0 else 0.0
-        
-        record = {
-            'date': current_date,
-            'total_invested': total_invested,
-            'final_value': current_value,
-            'profit': profit,
-            'return_rate': return_rate
-        }
-        
-        # 保存策略相关列
-        for col in ['profit_ratio', 'avg_cost']:
-            if col in current_row:
-                record[col] = current_row[col]
-                
-        daily_records.append(record)
+def run_backtest_prepared(history, strategy):
+    """
+    在预处理好的 HistoryView 上运行回测，返回每日状态 DataFrame
+    """
+    # 向量化策略读取整个区间，确保视图位于最后一天
+    history.advance(history.size - 1)
 
-    return pd.DataFrame(daily_records)
+    # 1. 计算每日投资金额 (内置策略为向量化实现，自定义策略逐日调用)
+    amounts = strategy.get_investment_amounts(history)
 
-def main():
-    print("Loading configuration from config.py...")
-    
-    symbol = config.SYMBOL
-    start_date = config.START_DATE
-    end_date = config.END_DATE
-    strategy_type = config.STRATEGY_TYPE
-    
-    strategy = None
-    strategy_name = ""
+    # 2. 记账 (累计投入、份额、市值、收益率)，安装 numba 时为编译后的内核
+    total_invested_arr, final_value_arr, profit_arr, return_rate_arr = \
+        backtest_core.run_backtest_kernel(history.column('close'), amounts, dtype=np.dtype(config.BACKTEST_DTYPE))
+
+    result = {
+        'date': history.column('date'),
+        'total_invested': total_invested_arr,
+        'final_value': final_value_arr,
+        'profit': profit_arr,
+        'return_rate': return_rate_arr
+    }
+
+    # 保存策略相关列
+    for col in ['profit_ratio', 'avg_cost']:
+        if col in history:
+            result[col] = history.column(col)
+
+    return pd.DataFrame(result)
+
+def run_backtest_v2(symbol, start_date, end_date, strategy, strategy_name="Custom Strategy", df=None):
+    """
+    运行回测，返回每日状态 DataFrame
+    :param df: 可选，直接传入 DataFrame
+    """
+    # 1. 加载数据
+    if df is None:
+        df = data_loader.load_data(symbol)
     
-    if strategy_type == 'fixed':
-        params = config.FIXED_STRATEGY_PARAMS
-        strategy = strategies.FixedInvestment(amount=params['amount'], freq=params['freq'])
-        strategy_name = f"Fixed_{params['freq']}_{params['amount']}"
-        
-    elif strategy_type == 'interval':
-        params = config.INTERVAL_STRATEGY_PARAMS
-        strategy = strategies.IntervalFixedInvestment(intervals=params)
-        strategy_name = "Interval_Custom"
-        
-    elif strategy_type == 'profit_ratio':
-        params = config.PROFIT_RATIO_STRATEGY_PARAMS
-        strategy = strategies.ProfitRatioStrategy(base_amount=params['base_amount'], thresholds=params['thresholds'])
-        strategy_name = "Profit_Ratio_Dynamic"
-
-    elif strategy_type == 'benchmark_drop':
-        params = config.BENCHMARK_DROP_STRATEGY_PARAMS
-        strategy = strategies.BenchmarkDropStrategy(
-            base_amount=params['base_amount'],
-            freq=params['freq'],
-            scale_factor=params['scale_factor']
-        )
-        strategy_name = f"BenchmarkDrop_{params['freq']}_x{params['scale_factor']}"
-
-    elif strategy_type == 'dynamic_benchmark':
-        params = config.DYNAMIC_BENCHMARK_STRATEGY_PARAMS
-        strategy = strategies.DynamicBenchmarkDropStrategy(
-            base_amount=params['base_amount'],
-            freq=params['freq'],
-            benchmark_type=params['benchmark_type'],
-            thresholds=params['thresholds']
-        )
-        strategy_name = f"DynamicBenchmark_{params['benchmark_type']}"
-
-    elif strategy_type == 'quadratic_ma':
-        params = config.QUADRATIC_MA_STRATEGY_PARAMS
-        strategy = strategies.QuadraticMAStrategy(
-            base_amount=params['base_amount'],
-            freq=params['freq'],
-            k_factor=params['k_factor'],
-            max_multiplier=params['max_multiplier']
-        )
-        strategy_name = f"QuadraticMA_K{params['k_factor']}"
+    if df is None:
+        print(f"Failed to load data for {symbol}")
+        return None
+
+    # 2. 过滤时间区间
+    history = prepare_backtest_frame(df, start_date, end_date)
+    if history is None:
+        print(f"No data in range {start_date} to {end_date} for {symbol}")
+        return None
+
+    # 3. 回测
+    print(f"Starting backtest for {symbol} ({strategy_name}) from {start_date} to {end_date}...")
+    return run_backtest_prepared(history, strategy)
+
+# 工作进程内共享的回测数据 (由进程池 initializer 设置，每个进程只传输一次)
+_shared_history = None
+
+def _set_shared_history(history):
+    global _shared_history
+    _shared_history = history
+
+def _run_with_shared_history(strategy):
+    return run_backtest_prepared(_shared_history, strategy)
+
+def run_backtests(symbol, start_date, end_date, strategy_list, max_workers=None):
+    """
+    对同一标的运行多个策略。数据加载与区间过滤只做一次，各策略相互独立。
+    默认在当前进程内顺序执行: 向量化后单个策略仅需几毫秒，进程池的启动与数据传输开销反而更大
+    :param strategy_list: [(strategy, strategy_name), ...]
+    :param max_workers: 进程数，大于 1 时使用进程池并行执行 (适合自定义的逐日策略等耗时较长的场景)
+    :return: dict {strategy_name: df_result}，顺序与 strategy_list 一致 (出错的策略不包含在内)
+    """
+    df = data_loader.load_data(symbol)
+    if df is None:
+        print(f"Failed to load data for {symbol}")
+        return {}
+
+    history = prepare_backtest_frame(df, start_date, end_date)
+    if history is None:
+        print(f"No data in range {start_date} to {end_date} for {symbol}")
+        return {}
 
+    # 单个策略出错时只跳过该策略，不影响其他策略的结果
+    results = {}
+    if not max_workers or max_workers <= 1 or len(strategy_list) <= 1:
+        for strategy, strategy_name in strategy_list:
+            print(f"\n--- Running Strategy: {strategy_name} ---")
+            try:
+                results[strategy_name] = run_backtest_prepared(history, strategy)
+            except Exception as e:
+                print(f"Error executing strategy {strategy_name}: {e}")
     else:
-        print(f"Error: Unknown strategy type '{strategy_type}' in config.py")
-        sys.exit(1)
-        
-    # Run the backtest v2
-    df_results = run_backtest_v2(symbol, start_date, end_date, strategy, strategy_name)
-    
-    if df_results is None or df_results.empty:
-        print("Backtest failed or returned no data.")
-        return
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_set_shared_history, initargs=(history,)) as executor:
+            futures = []
+            for strategy, strategy_name in strategy_list:
+                print(f"\n--- Running Strategy: {strategy_name} ---")
+                futures.append((strategy_name, executor.submit(_run_with_shared_history, strategy)))
 
-    # Plotting
-    # 设置 PDF 后端，无需 GUI
-    plt.switch_backend('Agg') 
-    
-    fig, ax = plt.subplots(figsize=(12, 6))
+            for strategy_name, future in futures:
+                try:
+                    results[strategy_name] = future.result()
+                except Exception as e:
+                    print(f"Error executing strategy {strategy_name}: {e}")
+
+    return results
+
+def run_portfolio(symbols, start_date, end_date, strategy_factory, max_workers=None, data=None):
+    """
+    对多个标的运行同一策略。数据通过 load_many 并发加载，各标的的回测默认在当前进程内顺序执行。
+    :param strategy_factory: 无参可调用对象 (如策略类或 functools.partial)，每个标的使用一个新的策略实例
+    :param max_workers: 进程数，大于 1 时使用进程池并行执行
+    :param data: 可选，直接传入 {symbol: DataFrame}
+    :return: dict {symbol: df_result}，顺序与 symbols 一致 (数据缺失或回测出错的标的不包含在内)
+    """
+    if data is None:
+        data = data_loader.load_many(symbols)
+
+    prepared = []
+    for symbol in dict.fromkeys(symbols):
+        df = data.get(symbol)
+        if df is None:
+            print(f"Failed to load data for {symbol}")
+            continue
+
+        history = prepare_backtest_frame(df, start_date, end_date)
+        if history is None:
+            print(f"No data in range {start_date} to {end_date} for {symbol}")
+            continue
+        prepared.append((symbol, history))
+
+    # 单个标的出错时只跳过该标的，不影响其他标的的结果
+    results = {}
+    if not max_workers or max_workers <= 1 or len(prepared) <= 1:
+        for symbol, history in prepared:
+            try:
+                results[symbol] = run_backtest_prepared(history, strategy_factory())
+            except Exception as e:
+                print(f"Error running backtest for {symbol}: {e}")
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [(symbol, executor.submit(run_backtest_prepared, history, strategy_factory()))
+                       for symbol, history in prepared]
+            for symbol, future in futures:
+                try:
+                    results[symbol] = future.result()
+                except Exception as e:
+                    print(f"Error running backtest for {symbol}: {e}")
+
+    return results
+
+def plot_return_rate(df_results, title, filepath, fig=None):
+    """
+    绘制收益率曲线并保存为 PDF
+    直接使用 matplotlib Figure (不经过 pyplot)：无需选择 GUI 后端，也不在 pyplot 中登记全局图形，批量绘图时不会累积
+    :param fig: 可选，复用的 Figure (清空后重新绘制)，批量绘图时避免重复创建
+    :return: 绘图使用的 Figure
+    """
+    # 仅在绘图时导入 matplotlib，作为库调用回测函数时无需加载
+    from matplotlib.figure import Figure
+    import matplotlib.dates as mdates
+
+    if fig is None:
+        fig = Figure(figsize=(12, 6))
+    else:
+        fig.clear()
+    ax = fig.subplots()
     
     # 绘制收益率曲线
     ax.plot(df_results['date'], df_results['return_rate'], label='Return Rate (%)', color='blue', linewidth=1.5)
     
-    ax.set_title(f"Backtest Return Rate: {symbol} ({strategy_name})\n{start_date} to {end_date}")
+    ax.set_title(title)
     ax.set_xlabel("Date (Year-Month)")
     ax.set_ylabel("Return Rate (%)")
     ax.grid(True, linestyle='--', alpha=0.7)
@@ -168,6 +217,41 @@ def main():
     # 旋转日期标签以防重叠
     fig.autofmt_xdate()
 
+    fig.savefig(filepath, format='pdf', bbox_inches='tight')
+    return fig
+
+def create_strategy(strategy_type):
+    """
+    根据策略类型 (DRAW_STRATEGY_LIST 中的名称) 创建策略实例
+    :return: (策略实例, 策略名称)，未知类型返回 (None, None)
+    """
+    builder = strategies.STRATEGY_BUILDERS.get(strategy_type)
+    if builder is None:
+        print(f"Warning: Unknown strategy type '{strategy_type}' in DRAW_STRATEGY_LIST")
+        return None, None
+    return builder(config)
+
+def main():
+    print("Loading configuration from config.py...")
+    
+    symbol = config.SYMBOL
+    start_date = config.START_DATE
+    end_date = config.END_DATE
+    strategy_type = config.STRATEGY_TYPE
+    
+    builder = strategies.STRATEGY_BUILDERS.get(strategy_type)
+    if builder is None:
+        print(f"Error: Unknown strategy type '{strategy_type}' in config.py")
+        sys.exit(1)
+    strategy, strategy_name = builder(config)
+        
+    # Run the backtest v2
+    df_results = run_backtest_v2(symbol, start_date, end_date, strategy, strategy_name)
+    
+    if df_results is None or df_results.empty:
+        print("Backtest failed or returned no data.")
+        return
+
     # 生成文件名
     filename = f"result_{symbol}_{strategy_name}.pdf"
     
@@ -178,8 +262,15 @@ def main():
     filepath = os.path.join(figures_dir, filename)
     
     # 保存为 PDF
+    title = f"Backtest Return Rate: {symbol} ({strategy_name})\n{start_date} to {end_date}"
+    plot_key = figure_cache.figure_key(f"main_v2.plot_return_rate/{PLOT_VERSION}", title, df_results['date'].to_numpy(), df_results['return_rate'].to_numpy())
+    if figure_cache.is_up_to_date(filepath, plot_key):
+        print(f"\nPlot unchanged, skipped: {filepath}")
+        return
+
     try:
-        plt.savefig(filepath, format='pdf', bbox_inches='tight')
+        plot_return_rate(df_results, title, filepath)
+        figure_cache.mark_saved(filepath, plot_key)
         print(f"\nSuccess! Plot saved to: {filepath}")
     except Exception as e:
         print(f"\nError saving plot: {e}")
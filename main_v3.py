@@ -1,69 +1,55 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 import data_loader
-import strategies
 import config
 import sys
 import os
-from main_v2 import run_backtest_v2
+from main_v2 import run_backtests, create_strategy
+from summary import build_comparison_summary
+import figure_cache
 
-def create_strategy(strategy_type):
+# 绘图样式版本 (参与图表缓存哈希)，修改绘图代码时递增，使已生成的图表重新绘制
+PLOT_VERSION = 2
+
+def plot_comparison(results, title, filepath):
     """
-    根据策略类型创建策略实例
+    绘制多策略收益率对比图并保存为 PDF
+    :param results: dict {strategy_name: df_result}
     """
-    strategy = None
-    strategy_name = ""
+    plt.switch_backend('Agg') 
     
-    if strategy_type == 'fixed':
-        params = config.FIXED_STRATEGY_PARAMS
-        strategy = strategies.FixedInvestment(amount=params['amount'], freq=params['freq'])
-        strategy_name = f"Fixed_{params['freq']}_{params['amount']}"
-        
-    elif strategy_type == 'interval':
-        params = config.INTERVAL_STRATEGY_PARAMS
-        strategy = strategies.IntervalFixedInvestment(intervals=params)
-        strategy_name = "Interval_Custom"
-        
-    elif strategy_type == 'profit_ratio':
-        params = config.PROFIT_RATIO_STRATEGY_PARAMS
-        strategy = strategies.ProfitRatioStrategy(base_amount=params['base_amount'], thresholds=params['thresholds'])
-        strategy_name = "Profit_Ratio_Dynamic"
-
-    elif strategy_type == 'benchmark_drop':
-        params = config.BENCHMARK_DROP_STRATEGY_PARAMS
-        strategy = strategies.BenchmarkDropStrategy(
-            base_amount=params['base_amount'], 
-            freq=params['freq'], 
-            scale_factor=params['scale_factor']
-        )
-        strategy_name = f"BenchmarkDrop_{params['freq']}_x{params['scale_factor']}"
-
-    elif strategy_type == 'dynamic_benchmark':
-        params = config.DYNAMIC_BENCHMARK_STRATEGY_PARAMS
-        strategy = strategies.DynamicBenchmarkDropStrategy(
-            base_amount=params['base_amount'],
-            freq=params['freq'],
-            benchmark_type=params['benchmark_type'],
-            thresholds=params['thresholds']
-        )
-        strategy_name = f"DynamicBenchmark_{params['benchmark_type']}"
-
-    elif strategy_type == 'quadratic_ma':
-        params = config.QUADRATIC_MA_STRATEGY_PARAMS
-        strategy = strategies.QuadraticMAStrategy(
-            base_amount=params['base_amount'],
-            freq=params['freq'],
-            k_factor=params['k_factor'],
-            max_multiplier=params['max_multiplier']
-        )
-        strategy_name = f"QuadraticMA_K{params['k_factor']}"
+    fig, ax = plt.subplots(figsize=(14, 8))
+    
+    # Plot all strategies as one LineCollection (one artist instead of one Line2D per strategy)
+    colors = ['blue', 'red', 'green', 'orange', 'purple', 'brown', 'cyan', 'magenta']
+    line_colors = [colors[i % len(colors)] for i in range(len(results))]
+    segments = [np.column_stack([mdates.date2num(df['date']), df['return_rate'].to_numpy()]) for df in results.values()]
+    ax.add_collection(LineCollection(segments, colors=line_colors, linewidths=1.5))
+    ax.xaxis_date()
+    ax.autoscale_view()
 
-    else:
-        print(f"Warning: Unknown strategy type '{strategy_type}' in DRAW_STRATEGY_LIST")
-        return None, None
+    # Legend entries are built from proxy lines
+    handles = [Line2D([], [], color=color, linewidth=1.5, label=f"{name} (Final: {df['return_rate'].iat[-1]:.2f}%)")
+               for (name, df), color in zip(results.items(), line_colors)]
         
-    return strategy, strategy_name
+    ax.set_title(title)
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Return Rate (%)")
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.legend(handles=handles, loc='upper left')
+    
+    # Formatting
+    locator = mdates.AutoDateLocator()
+    formatter = mdates.DateFormatter('%Y-%m')
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(formatter)
+    fig.autofmt_xdate()
+
+    plt.savefig(filepath, format='pdf', bbox_inches='tight')
 
 def main():
     print("Loading configuration from config.py...")
@@ -79,108 +65,45 @@ def main():
 
     print(f"Comparing strategies for {symbol}: {draw_list}")
     
-    results = {}
-    
-    # 1. Run Backtests
+    # 1. Run Backtests (data is loaded once; serial by default, set config.BACKTEST_MAX_WORKERS > 1 to use a process pool)
+    strategy_list = []
     for strat_type in draw_list:
         strategy, strategy_name = create_strategy(strat_type)
-        if strategy is None:
-            continue
-            
-        print(f"\n--- Running Strategy: {strategy_name} ---")
-        df_result = run_backtest_v2(symbol, start_date, end_date, strategy, strategy_name)
-        
-        if df_result is not None and not df_result.empty:
-            results[strategy_name] = df_result
-        else:
-            print(f"Strategy {strategy_name} returned no results.")
+        if strategy is not None:
+            strategy_list.append((strategy, strategy_name))
+
+    results = run_backtests(symbol, start_date, end_date, strategy_list, max_workers=config.BACKTEST_MAX_WORKERS)
 
     if not results:
         print("No results to plot.")
         return
 
-    # 2. Plotting Comparison
-    print("\nGenerating comparison plot...")
-    plt.switch_backend('Agg') 
-    
-    fig, ax = plt.subplots(figsize=(14, 8))
-    
-    # Plot each strategy
-    colors = ['blue', 'red', 'green', 'orange', 'purple', 'brown', 'cyan', 'magenta']
-    color_idx = 0
-    
-    for name, df in results.items():
-        color = colors[color_idx % len(colors)]
-        ax.plot(df['date'], df['return_rate'], label=f"{name} (Final: {df.iloc[-1]['return_rate']:.2f}%)", color=color, linewidth=1.5)
-        color_idx += 1
-        
-    ax.set_title(f"Strategy Comparison: {symbol}\n{start_date} to {end_date}")
-    ax.set_xlabel("Date")
-    ax.set_ylabel("Return Rate (%)")
-    ax.grid(True, linestyle='--', alpha=0.7)
-    ax.legend(loc='upper left')
-    
-    # Formatting
-    locator = mdates.AutoDateLocator()
-    formatter = mdates.DateFormatter('%Y-%m')
-    ax.xaxis.set_major_locator(locator)
-    ax.xaxis.set_major_formatter(formatter)
-    fig.autofmt_xdate()
-    
-    # Save
+    # 2. Plotting Comparison (inputs unchanged since the last run -> keep the existing PDF)
     filename = f"comparison_{symbol}_{start_date}_{end_date}.pdf".replace(' ', '_').replace(':', '')
     figures_dir = os.path.join(os.getcwd(), 'figures')
     os.makedirs(figures_dir, exist_ok=True)
     filepath = os.path.join(figures_dir, filename)
-    
-    try:
-        plt.savefig(filepath, format='pdf', bbox_inches='tight')
-        print(f"\nSuccess! Comparison plot saved to: {filepath}")
-    except Exception as e:
-        print(f"\nError saving plot: {e}")
+
+    title = f"Strategy Comparison: {symbol}\n{start_date} to {end_date}"
+    plot_key = figure_cache.figure_key(f"main_v3.plot_comparison/{PLOT_VERSION}", title, *[part for name, df in results.items()
+                                                for part in (name, df['date'].to_numpy(), df['return_rate'].to_numpy())])
+    if figure_cache.is_up_to_date(filepath, plot_key):
+        print(f"\nComparison plot unchanged, skipped: {filepath}")
+    else:
+        print("\nGenerating comparison plot...")
+        try:
+            plot_comparison(results, title, filepath)
+            figure_cache.mark_saved(filepath, plot_key)
+            print(f"\nSuccess! Comparison plot saved to: {filepath}")
+        except Exception as e:
+            print(f"\nError saving plot: {e}")
 
     # 3. Print Summary Table
     print("\n" + "="*100)
     print("FINAL STRATEGY COMPARISON")
     print("="*100)
     
-    # Calculate duration in years for annualization
-    s_dt = pd.to_datetime(start_date)
-    e_dt = pd.to_datetime(end_date)
-    duration_days = (e_dt - s_dt).days
-    years = duration_days / 365.25
-    
-    summary_data = []
-    for name, df in results.items():
-        last_row = df.iloc[-1]
-        invested = last_row['total_invested']
-        value = last_row['final_value']
-        profit = value - invested
-        
-        if invested > 0:
-            ret_rate = (profit / invested * 100)
-            # CAGR formula: (End_Value / Start_Value) ^ (1/n) - 1
-            # Note: This treats total_invested as initial lump sum (Conservative for SIP)
-            if years > 0 and value > 0:
-                annualized = ((value / invested) ** (1 / years) - 1) * 100
-            else:
-                annualized = 0.0
-        else:
-            ret_rate = 0
-            annualized = 0
-        
-        summary_data.append({
-            "Strategy": name,
-            "Total Invested": invested,
-            "Final Value": value,
-            "Profit": profit,
-            "Return Rate (%)": ret_rate,
-            "Annualized (%)": annualized
-        })
-        
-    summary_df = pd.DataFrame(summary_data)
-    # Sort by Return Rate descending
-    summary_df = summary_df.sort_values(by="Return Rate (%)", ascending=False)
+    summary_df = build_comparison_summary(results, start_date, end_date)
     
     # Format for pretty printing
     pd.set_option('display.max_columns', None)
@@ -1,140 +1,38 @@
 import pandas as pd
 import plotly.graph_objects as go
 import data_loader
-import strategies
 import config
 import sys
 import os
-from main_v2 import run_backtest_v2
+from main_v2 import run_backtests, create_strategy
+from summary import build_comparison_summary, calc_annualized_return_vec
+import figure_cache
 
-def create_strategy(strategy_type):
+# 绘图样式版本 (参与图表缓存哈希)，修改绘图代码时递增，使已生成的图表重新绘制
+PLOT_VERSION = 3
+
+def plot_comparison(results, symbol, start_date, end_date, filepath):
     """
-    根据策略类型创建策略实例 (Copied from main_v3.py)
+    生成多策略收益率交互式对比图并保存为 HTML
+    :param results: dict {strategy_name: df_result}
     """
-    strategy = None
-    strategy_name = ""
-    
-    if strategy_type == 'fixed':
-        params = config.FIXED_STRATEGY_PARAMS
-        strategy = strategies.FixedInvestment(amount=params['amount'], freq=params['freq'])
-        strategy_name = f"Fixed_{params['freq']}_{params['amount']}"
-        
-    elif strategy_type == 'interval':
-        params = config.INTERVAL_STRATEGY_PARAMS
-        strategy = strategies.IntervalFixedInvestment(intervals=params)
-        strategy_name = "Interval_Custom"
-        
-    elif strategy_type == 'profit_ratio':
-        params = config.PROFIT_RATIO_STRATEGY_PARAMS
-        strategy = strategies.ProfitRatioStrategy(base_amount=params['base_amount'], thresholds=params['thresholds'])
-        strategy_name = "Profit_Ratio_Dynamic"
-
-    elif strategy_type == 'benchmark_drop':
-        params = config.BENCHMARK_DROP_STRATEGY_PARAMS
-        strategy = strategies.BenchmarkDropStrategy(
-            base_amount=params['base_amount'], 
-            freq=params['freq'], 
-            scale_factor=params['scale_factor']
-        )
-        strategy_name = f"BenchmarkDrop_{params['freq']}_x{params['scale_factor']}"
-
-    elif strategy_type == 'dynamic_benchmark':
-        params = config.DYNAMIC_BENCHMARK_STRATEGY_PARAMS
-        strategy = strategies.DynamicBenchmarkDropStrategy(
-            base_amount=params['base_amount'],
-            freq=params['freq'],
-            benchmark_type=params['benchmark_type'],
-            thresholds=params['thresholds']
-        )
-        strategy_name = f"DynamicBenchmark_{params['benchmark_type']}"
-
-    elif strategy_type == 'quadratic_ma':
-        params = config.QUADRATIC_MA_STRATEGY_PARAMS
-        strategy = strategies.QuadraticMAStrategy(
-            base_amount=params['base_amount'],
-            freq=params['freq'],
-            k_factor=params['k_factor'],
-            max_multiplier=params['max_multiplier']
-        )
-        strategy_name = f"QuadraticMA_K{params['k_factor']}"
-
-    else:
-        print(f"Warning: Unknown strategy type '{strategy_type}' in DRAW_STRATEGY_LIST")
-        return None, None
-        
-    return strategy, strategy_name
-
-def main():
-    print("Loading configuration from config.py...")
-    
-    symbol = config.SYMBOL
-    start_date = config.START_DATE
-    end_date = config.END_DATE
-    draw_list = config.DRAW_STRATEGY_LIST
-    
-    if not draw_list:
-        print("Error: DRAW_STRATEGY_LIST is empty in config.py")
-        return
-
-    print(f"Comparing strategies for {symbol}: {draw_list}")
-    
-    results = {}
-    
-    # 1. Run Backtests
-    for strat_type in draw_list:
-        strategy, strategy_name = create_strategy(strat_type)
-        if strategy is None:
-            continue
-            
-        print(f"\n--- Running Strategy: {strategy_name} ---")
-        df_result = run_backtest_v2(symbol, start_date, end_date, strategy, strategy_name)
-        
-        if df_result is not None and not df_result.empty:
-            results[strategy_name] = df_result
-        else:
-            print(f"Strategy {strategy_name} returned no results.")
-
-    if not results:
-        print("No results to plot.")
-        return
-
-    # 2. Plotting Comparison with Plotly
-    print("\nGenerating interactive comparison plot...")
-    
     fig = go.Figure()
     
     for name, df in results.items():
         # Pre-calculate annualized return for hover data
-        first_date = df['date'].iloc[0]
-        
-        def calc_annualized(row):
-            invested = row['total_invested']
-            value = row['final_value']
-            
-            if invested <= 0:
-                return 0.0
-                
-            days_diff = (row['date'] - first_date).days
-            years_diff = days_diff / 365.25
-            
-            if years_diff < 0.01: # Avoid division by zero or extreme volatility at start
-                return 0.0
-                
-            try:
-                if value <= 0: return -100.0
-                return ((value / invested) ** (1 / years_diff) - 1) * 100
-            except:
-                return 0.0
+        days_diff = (df['date'] - df['date'].iat[0]).dt.days.to_numpy()
 
         # Create a copy to avoid SettingWithCopyWarning if slice
         df_plot = df.copy()
-        df_plot['annualized_hover'] = df_plot.apply(calc_annualized, axis=1)
+        df_plot['annualized_hover'] = calc_annualized_return_vec(
+            df_plot['total_invested'].to_numpy(), df_plot['final_value'].to_numpy(), days_diff)
 
-        fig.add_trace(go.Scatter(
+        # WebGL 渲染: 数千个点 x 多个策略时比 SVG 流畅
+        fig.add_trace(go.Scattergl(
             x=df_plot['date'],
             y=df_plot['return_rate'],
             mode='lines',
-            name=f"{name} (Final: {df_plot.iloc[-1]['return_rate']:.2f}%)",
+            name=f"{name} (Final: {df_plot['return_rate'].iat[-1]:.2f}%)",
             # Pass extra data for hover: [Total Invested, Annualized Return, Final Value]
             customdata=df_plot[['total_invested', 'annualized_hover', 'final_value']],
             hovertemplate=(
@@ -170,57 +68,64 @@ def main():
         template="plotly_white"
     )
 
-    # 3. Save to HTML
+    fig.write_html(filepath, include_plotlyjs=config.PLOTLY_INCLUDE_JS)
+
+def main():
+    print("Loading configuration from config.py...")
+    
+    symbol = config.SYMBOL
+    start_date = config.START_DATE
+    end_date = config.END_DATE
+    draw_list = config.DRAW_STRATEGY_LIST
+    
+    if not draw_list:
+        print("Error: DRAW_STRATEGY_LIST is empty in config.py")
+        return
+
+    print(f"Comparing strategies for {symbol}: {draw_list}")
+    
+    # 1. Run Backtests (data is loaded once; serial by default, set config.BACKTEST_MAX_WORKERS > 1 to use a process pool)
+    strategy_list = []
+    for strat_type in draw_list:
+        strategy, strategy_name = create_strategy(strat_type)
+        if strategy is not None:
+            strategy_list.append((strategy, strategy_name))
+
+    results = run_backtests(symbol, start_date, end_date, strategy_list, max_workers=config.BACKTEST_MAX_WORKERS)
+
+    if not results:
+        print("No results to plot.")
+        return
+
+    # 2. Plotting Comparison with Plotly (inputs unchanged since the last run -> keep the existing HTML)
     filename = f"interactive_comparison_{symbol}_{start_date}_{end_date}.html".replace(' ', '_').replace(':', '')
     figures_dir = os.path.join(os.getcwd(), 'figures')
     os.makedirs(figures_dir, exist_ok=True)
     filepath = os.path.join(figures_dir, filename)
-    
-    try:
-        fig.write_html(filepath)
-        print(f"\nSuccess! Interactive plot saved to: {filepath}")
-        print(f"You can open this file in any browser: explorer.exe {filepath} (if using WSL)")
-    except Exception as e:
-        print(f"\nError saving plot: {e}")
 
-    # 4. Print Summary Table (Same as v3)
+    plot_key = figure_cache.figure_key(
+        f"main_v4_plotly.plot_comparison/{PLOT_VERSION}", symbol, start_date, end_date, config.PLOTLY_INCLUDE_JS, *[
+        part for name, df in results.items()
+        for part in (name, df['date'].to_numpy(), df['return_rate'].to_numpy(),
+                     df['total_invested'].to_numpy(), df['final_value'].to_numpy())])
+    if figure_cache.is_up_to_date(filepath, plot_key):
+        print(f"\nInteractive plot unchanged, skipped: {filepath}")
+    else:
+        print("\nGenerating interactive comparison plot...")
+        try:
+            plot_comparison(results, symbol, start_date, end_date, filepath)
+            figure_cache.mark_saved(filepath, plot_key)
+            print(f"\nSuccess! Interactive plot saved to: {filepath}")
+            print(f"You can open this file in any browser: explorer.exe {filepath} (if using WSL)")
+        except Exception as e:
+            print(f"\nError saving plot: {e}")
+
+    # 3. Print Summary Table (Same as v3)
     print("\n" + "="*100)
     print("FINAL STRATEGY COMPARISON")
     print("="*100)
     
-    s_dt = pd.to_datetime(start_date)
-    e_dt = pd.to_datetime(end_date)
-    duration_days = (e_dt - s_dt).days
-    years = duration_days / 365.25
-    
-    summary_data = []
-    for name, df in results.items():
-        last_row = df.iloc[-1]
-        invested = last_row['total_invested']
-        value = last_row['final_value']
-        profit = value - invested
-        
-        if invested > 0:
-            ret_rate = (profit / invested * 100)
-            if years > 0 and value > 0:
-                annualized = ((value / invested) ** (1 / years) - 1) * 100
-            else:
-                annualized = 0.0
-        else:
-            ret_rate = 0
-            annualized = 0
-        
-        summary_data.append({
-            "Strategy": name,
-            "Total Invested": invested,
-            "Final Value": value,
-            "Profit": profit,
-            "Return Rate (%)": ret_rate,
-            "Annualized (%)": annualized
-        })
-        
-    summary_df = pd.DataFrame(summary_data)
-    summary_df = summary_df.sort_values(by="Return Rate (%)", ascending=False)
+    summary_df = build_comparison_summary(results, start_date, end_date)
     
     pd.set_option('display.max_columns', None)
     pd.set_option('display.width', 1000)
@@ -3,8 +3,12 @@ import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import data_loader
 import config
+import figure_cache
 import os
 
+# 绘图样式版本 (参与图表缓存哈希)，修改绘图代码时递增，使已生成的图表重新绘制
+PLOT_VERSION = 1
+
 def main():
     print("Loading configuration from config.py...")
     symbol = config.SYMBOL
@@ -22,7 +26,19 @@ def main():
     print(f"Date range: {df['date'].min()} to {df['date'].max()}")
     print(f"Price range: {df['close'].min()} to {df['close'].max()}")
 
-    # 2. 绘图
+    # 2. 保存路径 (数据未变化时保留已有的图表)
+    figures_dir = os.path.join(os.getcwd(), 'figures')
+    os.makedirs(figures_dir, exist_ok=True)
+    
+    filename = f"original_close_{symbol}.pdf"
+    filepath = os.path.join(figures_dir, filename)
+    
+    plot_key = figure_cache.figure_key(f"original_close_price_fig/{PLOT_VERSION}", symbol, df['date'].to_numpy(), df['close'].to_numpy())
+    if figure_cache.is_up_to_date(filepath, plot_key):
+        print(f"\nClose price plot unchanged, skipped: {filepath}")
+        return
+
+    # 3. 绘图
     plt.switch_backend('Agg') 
     fig, ax = plt.subplots(figsize=(12, 6))
     
@@ -42,15 +58,9 @@ def main():
     
     fig.autofmt_xdate()
     
-    # 3. 保存
-    figures_dir = os.path.join(os.getcwd(), 'figures')
-    os.makedirs(figures_dir, exist_ok=True)
-    
-    filename = f"original_close_{symbol}.pdf"
-    filepath = os.path.join(figures_dir, filename)
-    
     try:
         plt.savefig(filepath, format='pdf', bbox_inches='tight')
+        figure_cache.mark_saved(filepath, plot_key)
         print(f"\nSuccess! Close price plot saved to: {filepath}")
     except Exception as e:
         print(f"\nError saving plot: {e}")
@@ -1,21 +1,196 @@
 from abc import ABC, abstractmethod
+import numpy as np
 import pandas as pd
 
+class HistoryView:
+    """
+    回测历史数据视图，替代每天对 DataFrame 做 iloc[:i+1] 切片。
+    各列在构造时一次性转换为 numpy 数组，回测循环每天只移动 end 下标，
+    策略读取 [0, end] 范围内的数据 (包含今天)。
+    日期列表、DataFrame 与滚动统计按需生成；序列化 (传给进程池) 时只包含列数组。
+    """
+    def __init__(self, df):
+        """
+        :param df: 回测区间内的完整数据 DataFrame (按日期升序, index 从 0 开始)
+        """
+        self._df = df
+        self._arrays = {col: df[col].to_numpy() for col in df.columns}
+        self._dates = None
+        self._rolling = {}
+        self.size = len(df)
+        self.end = self.size - 1
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # DataFrame、日期列表和滚动统计都可由列数组重建，不随进程间传输重复序列化
+        state['_df'] = None
+        state['_dates'] = None
+        state['_rolling'] = {}
+        return state
+
+    def _frame(self):
+        """
+        完整区间的 DataFrame (反序列化后由列数组重建)
+        """
+        if self._df is None:
+            self._df = pd.DataFrame(self._arrays)
+        return self._df
+
+    def advance(self, i):
+        """
+        将视图推进到第 i 个交易日 (包含)，返回自身以便直接传给策略
+        """
+        self.end = i
+        return self
+
+    def __len__(self):
+        return self.end + 1
+
+    def __contains__(self, col):
+        return col in self._arrays
+
+    @property
+    def empty(self):
+        return self.end < 0
+
+    @property
+    def close(self):
+        return self.column('close')
+
+    def column(self, col):
+        """
+        截止到今天的某列数据 (numpy 视图，不复制)
+        """
+        return self._arrays[col][:self.end + 1]
+
+    def value(self, col, pos=-1):
+        """
+        读取单个值
+        :param pos: 视图内的位置，0 为第一天，-1 为今天，-2 为上一个交易日
+        """
+        idx = pos if pos >= 0 else self.end + 1 + pos
+        return self._arrays[col][idx]
+
+    def date(self, pos=-1):
+        """
+        读取日期 (pd.Timestamp)，pos 含义同 value
+        """
+        if self._dates is None:
+            # 逐日调用的策略需要 Timestamp 列表，首次读取日期时才生成
+            self._dates = pd.Series(self._arrays['date']).tolist()
+        idx = pos if pos >= 0 else self.end + 1 + pos
+        return self._dates[idx]
+
+    def rolling(self, window, how='mean', col='close', min_periods=None):
+        """
+        整个回测区间的滚动统计 (如 MA250, 近60日最高)，首次调用时一次性计算并缓存。
+        返回完整长度的数组，今天的值为 [self.end]，数据不足 min_periods 时为 NaN。
+        :param how: 'mean', 'max', 'min' 等 pandas Rolling 方法名
+        """
+        key = (col, window, how, min_periods)
+        if key not in self._rolling:
+            roller = pd.Series(self._arrays[col]).rolling(window, min_periods=min_periods)
+            self._rolling[key] = getattr(roller, how)().to_numpy(dtype=float)
+        return self._rolling[key]
+
+    def as_dataframe(self):
+        """
+        兼容旧接口: 构造截止到今天的 DataFrame 切片 (较慢，仅供未迁移的策略使用)
+        """
+        return self._frame().iloc[:self.end + 1]
+
 class BaseStrategy(ABC):
+    # 是否直接接受 HistoryView。
+    # 自定义策略默认为 False，回测引擎会为其构造 DataFrame 切片 (旧接口，较慢)
+    accepts_history_view = False
+
     @abstractmethod
     def get_investment_amount(self, history_df, current_date):
         """
         计算当天的投资金额
-        :param history_df: 截止到 current_date 的历史数据 DataFrame (应包含今天的数据)
+        :param history_df: 截止到 current_date 的历史数据 (应包含今天的数据)。
+                           accepts_history_view 为 True 时是 HistoryView，否则是 DataFrame
         :param current_date: 当前日期 (datetime/Timestamp)
         :return: float (投资金额, 0 表示不投资)
         """
         pass
 
+    def get_investment_amounts(self, history):
+        """
+        一次性计算整个回测区间每天的投资金额
+        默认实现逐日调用 get_investment_amount；金额只依赖当天及之前数据的策略应重写为向量化版本。
+        :param history: 整个回测区间的 HistoryView
+        :return: numpy 数组 (与回测区间等长)
+        """
+        amounts = np.zeros(history.size, dtype=np.float64)
+        use_view = self.accepts_history_view
+        for i in range(history.size):
+            current_date = history.date(i)
+            history.advance(i)
+            history_subset = history if use_view else history.as_dataframe()
+            amounts[i] = self.get_investment_amount(history_subset, current_date)
+        return amounts
+
+def _is_investment_day(history, current_date, freq):
+    """
+    定投时机判断: 回测第一天总是投资，之后按频率判断是否进入新的周期
+    :param history: HistoryView
+    :param freq: 'D' (日), 'W' (周), 'M' (月)
+    """
+    # 如果只有一行数据（今天），说明是回测的第一天，执行投资
+    if len(history) == 1:
+        return True
+
+    # 上一个交易日
+    prev_date = history.date(-2)
+
+    if freq == 'M':
+        # 如果月份变化，说明进入新的一月
+        return current_date.month != prev_date.month or current_date.year != prev_date.year
+    elif freq == 'W':
+        # 如果周数变化 (注意跨年时的周数)
+        return current_date.isocalendar()[1] != prev_date.isocalendar()[1] or current_date.year != prev_date.year
+    elif freq == 'D':
+        return True
+    return False
+
+def _investment_day_mask(history, freq):
+    """
+    _is_investment_day 的向量化版本: 整个回测区间每天是否为定投日
+    :param history: 整个回测区间的 HistoryView
+    :return: bool 数组
+    """
+    # 周期编号用整数计算，不经过 DatetimeIndex 的日历字段
+    dates = history.column('date').astype('datetime64[D]')
+    n = len(dates)
+    if freq == 'D':
+        mask = np.ones(n, dtype=bool)
+    elif freq == 'M':
+        # 自 1970-01 起的月序号，变化即进入新的一月 (已包含跨年)
+        month = dates.astype('datetime64[M]').view('int64')
+        mask = np.zeros(n, dtype=bool)
+        mask[1:] = month[1:] != month[:-1]
+    elif freq == 'W':
+        # 1970-01-01 为周四，(天数 + 3) // 7 为按周一起始的 ISO 周序号; 跨年同样视为新的周期
+        days = dates.view('int64')
+        week = (days + 3) // 7
+        year = dates.astype('datetime64[Y]').view('int64')
+        mask = np.zeros(n, dtype=bool)
+        mask[1:] = (week[1:] != week[:-1]) | (year[1:] != year[:-1])
+    else:
+        mask = np.zeros(n, dtype=bool)
+
+    # 回测第一天总是投资
+    if n > 0:
+        mask[0] = True
+    return mask
+
 class FixedInvestment(BaseStrategy):
     """
     定期定额投资策略
     """
+    accepts_history_view = True
+
     def __init__(self, amount, freq='M'):
         """
         :param amount: 每次定投金额
@@ -28,38 +203,21 @@ class FixedInvestment(BaseStrategy):
         # 必须确保 history_df 按时间排序且非空
         if history_df.empty:
             return 0.0
-            
-        # 如果只有一行数据（今天），说明是回测的第一天，执行投资
-        if len(history_df) == 1:
-            return self.amount
-
-        # 获取上一个交易日的日期
-        # history_df 的最后一行应该是今天 (current_date)
-        # 倒数第二行是上一个交易日
-        prev_date = history_df.iloc[-2]['date']
-        
-        # 确保 prev_date 是 timestamp 类型
-        if not isinstance(prev_date, pd.Timestamp):
-            prev_date = pd.to_datetime(prev_date)
-
-        should_invest = False
-        if self.freq == 'M':
-            # 如果月份变化，说明进入新的一月
-            if current_date.month != prev_date.month or current_date.year != prev_date.year:
-                should_invest = True
-        elif self.freq == 'W':
-            # 如果周数变化 (注意跨年时的周数)
-            if current_date.isocalendar()[1] != prev_date.isocalendar()[1] or current_date.year != prev_date.year:
-                 should_invest = True
-        elif self.freq == 'D':
-            should_invest = True
-            
-        return self.amount if should_invest else 0.0
+
+        return self.amount if _is_investment_day(history_df, current_date, self.freq) else 0.0
+
+    def get_investment_amounts(self, history):
+        if self.freq == 'D':
+            # 每日定投金额恒定，无需判断定投日
+            return np.full(history.size, float(self.amount))
+        return np.where(_investment_day_mask(history, self.freq), float(self.amount), 0.0)
 
 class IntervalFixedInvestment(BaseStrategy):
     """
     区间定投策略：根据时间区间设定不同的定投参数
     """
+    accepts_history_view = True
+
     def __init__(self, intervals):
         """
         :param intervals: 列表，每个元素为 dict 
@@ -80,12 +238,25 @@ class IntervalFixedInvestment(BaseStrategy):
                 return item['strategy'].get_investment_amount(history_df, current_date)
         return 0.0
 
+    def get_investment_amounts(self, history):
+        dates = history.column('date')
+        amounts = np.zeros(history.size, dtype=np.float64)
+        # 与逐日版本一致: 日期落在多个区间时以第一个匹配的区间为准
+        assigned = np.zeros(history.size, dtype=bool)
+        for item in self.interval_strategies:
+            in_range = (dates >= item['start']) & (dates <= item['end']) & ~assigned
+            amounts[in_range] = item['strategy'].get_investment_amounts(history)[in_range]
+            assigned |= in_range
+        return amounts
+
 class ProfitRatioStrategy(BaseStrategy):
     """
     获利比例策略：
     基于每日获利比例 (profit_ratio) 调整定投金额。
     默认执行频率为每日 (即每天都会检查并可能买入)。
     """
+    accepts_history_view = True
+
     def __init__(self, base_amount, thresholds=None):
         """
         :param base_amount: 基准定投金额 (1倍)
@@ -108,15 +279,13 @@ class ProfitRatioStrategy(BaseStrategy):
         if history_df.empty:
             return 0.0
             
-        # 获取当天的行
-        today_row = history_df.iloc[-1]
-        
         # 检查是否有 'profit_ratio' 列
-        if 'profit_ratio' not in today_row:
+        if 'profit_ratio' not in history_df:
             # 如果没有数据，回退到基准定投
             return self.base_amount
             
-        profit_ratio = today_row['profit_ratio']
+        # 获取当天的获利比例
+        profit_ratio = history_df.value('profit_ratio')
         
         # 处理 NaN
         if pd.isna(profit_ratio):
@@ -131,6 +300,19 @@ class ProfitRatioStrategy(BaseStrategy):
                 
         return self.base_amount * multiplier
 
+    def get_investment_amounts(self, history):
+        if 'profit_ratio' not in history:
+            return np.full(history.size, float(self.base_amount))
+
+        # NaN 与任何阈值比较均为 False，自然回退到 1 倍
+        profit_ratio = pd.to_numeric(pd.Series(history.column('profit_ratio')), errors='coerce').to_numpy(dtype=float)
+        multiplier = np.select(
+            [profit_ratio < limit for limit, _ in self.thresholds],
+            [float(mult) for _, mult in self.thresholds],
+            default=1.0
+        )
+        return self.base_amount * multiplier
+
 class QuadraticMAStrategy(BaseStrategy):
     """
     策略6: 均线偏离平方策略
@@ -140,6 +322,8 @@ class QuadraticMAStrategy(BaseStrategy):
     买入金额 = Base * (1 + K * D^2)
     设置最大倍数上限。
     """
+    accepts_history_view = True
+
     def __init__(self, base_amount, freq='D', k_factor=30.0, max_multiplier=5.0):
         """
         :param base_amount: 基准投资金额
@@ -158,37 +342,17 @@ class QuadraticMAStrategy(BaseStrategy):
             return 0.0
             
         # 1. 时机判断
-        should_invest = False
-        if len(history_df) == 1:
-            should_invest = True
-        else:
-            prev_date = history_df.iloc[-2]['date']
-            if not isinstance(prev_date, pd.Timestamp):
-                prev_date = pd.to_datetime(prev_date)
-            
-            if self.freq == 'D':
-                should_invest = True
-            elif self.freq == 'M':
-                if current_date.month != prev_date.month or current_date.year != prev_date.year:
-                    should_invest = True
-            elif self.freq == 'W':
-                if current_date.isocalendar()[1] != prev_date.isocalendar()[1] or current_date.year != prev_date.year:
-                    should_invest = True
-        
-        if not should_invest:
+        if not _is_investment_day(history_df, current_date, self.freq):
             return 0.0
 
-        # 2. 计算 MA250
-        close_series = history_df['close']
-        ma250 = None
-        
-        if len(close_series) >= 250:
-            ma250 = close_series.iloc[-250:].mean()
+        # 2. 读取 MA250 (整个区间预先计算一次)
+        if len(history_df) >= 250:
+            ma250 = history_df.rolling(250)[history_df.end]
         else:
             # 数据不足，无法计算 MA250，使用基准金额
             return self.base_amount
 
-        current_price = history_df.iloc[-1]['close']
+        current_price = history_df.value('close')
         
         # 3. 计算买入金额
         if current_price < ma250:
@@ -201,6 +365,18 @@ class QuadraticMAStrategy(BaseStrategy):
             # 现价 >= MA250，维持基准定投
             return self.base_amount
 
+    def get_investment_amounts(self, history):
+        closes = history.close.astype(float)
+        ma250 = history.rolling(250)
+
+        # 数据不足 250 天时 ma250 为 NaN，比较结果为 False，维持基准金额
+        with np.errstate(invalid='ignore'):
+            below = closes < ma250
+            d = (ma250 - closes) / ma250
+            multiplier = np.minimum(1 + self.k_factor * (d ** 2), self.max_multiplier)
+        amounts = np.where(below, self.base_amount * multiplier, float(self.base_amount))
+        return np.where(_investment_day_mask(history, self.freq), amounts, 0.0)
+
 class BenchmarkDropStrategy(BaseStrategy):
     """
     策略4: 标杆跌幅策略
@@ -208,6 +384,8 @@ class BenchmarkDropStrategy(BaseStrategy):
     如果某天价格低于标杆，则买入金额增加对应的跌幅比例。
     Invest = Base * (1 + (Benchmark - Current) / Benchmark * ScaleFactor)
     """
+    accepts_history_view = True
+
     def __init__(self, base_amount, freq='D', scale_factor=1.0):
         """
         :param base_amount: 基准投资金额
@@ -225,34 +403,13 @@ class BenchmarkDropStrategy(BaseStrategy):
             return 0.0
             
         # 1. 判断是否是定投日
-        # 利用 FixedInvestment 的逻辑，传入 dummy amount 0，只看是否返回 0
-        # 但 FixedInvestment 返回 amount 或 0。
-        # 这里为了避免重复代码，我简单重写一遍时机判断逻辑
-        
-        should_invest = False
-        if len(history_df) == 1:
-            should_invest = True
-        else:
-            prev_date = history_df.iloc[-2]['date']
-            if not isinstance(prev_date, pd.Timestamp):
-                prev_date = pd.to_datetime(prev_date)
-            
-            if self.freq == 'D':
-                should_invest = True
-            elif self.freq == 'M':
-                if current_date.month != prev_date.month or current_date.year != prev_date.year:
-                    should_invest = True
-            elif self.freq == 'W':
-                if current_date.isocalendar()[1] != prev_date.isocalendar()[1] or current_date.year != prev_date.year:
-                    should_invest = True
-        
-        if not should_invest:
+        if not _is_investment_day(history_df, current_date, self.freq):
             return 0.0
 
         # 2. 计算金额
         # 标杆价格: 第一天的收盘价
-        benchmark_price = history_df.iloc[0]['close']
-        current_price = history_df.iloc[-1]['close']
+        benchmark_price = history_df.value('close', 0)
+        current_price = history_df.value('close')
         
         if current_price < benchmark_price:
             drop_ratio = (benchmark_price - current_price) / benchmark_price
@@ -265,12 +422,26 @@ class BenchmarkDropStrategy(BaseStrategy):
             
         return investment
 
+    def get_investment_amounts(self, history):
+        closes = history.close.astype(float)
+        if history.size == 0:
+            return closes
+
+        benchmark_price = closes[0]
+        drop_ratio = (benchmark_price - closes) / benchmark_price
+        amounts = np.where(closes < benchmark_price,
+                           self.base_amount * (1 + drop_ratio * self.scale_factor),
+                           float(self.base_amount))
+        return np.where(_investment_day_mask(history, self.freq), amounts, 0.0)
+
 class DynamicBenchmarkDropStrategy(BaseStrategy):
     """
     策略5: 动态标杆回撤策略
     以 MA250 或 近60日最高点 为标杆。
     根据价格跌破标杆的幅度，分档位增加买入金额。
     """
+    accepts_history_view = True
+
     def __init__(self, base_amount, freq='D', benchmark_type='ma250', thresholds=None):
         """
         :param base_amount: 基准投资金额
@@ -294,44 +465,24 @@ class DynamicBenchmarkDropStrategy(BaseStrategy):
         if history_df.empty:
             return 0.0
             
-        # 1. 时机判断 (复用 FixedInvestment 逻辑的简化版)
-        should_invest = False
-        if len(history_df) == 1:
-            should_invest = True
-        else:
-            prev_date = history_df.iloc[-2]['date']
-            if not isinstance(prev_date, pd.Timestamp):
-                prev_date = pd.to_datetime(prev_date)
-            
-            if self.freq == 'D':
-                should_invest = True
-            elif self.freq == 'M':
-                if current_date.month != prev_date.month or current_date.year != prev_date.year:
-                    should_invest = True
-            elif self.freq == 'W':
-                if current_date.isocalendar()[1] != prev_date.isocalendar()[1] or current_date.year != prev_date.year:
-                    should_invest = True
-        
-        if not should_invest:
+        # 1. 时机判断
+        if not _is_investment_day(history_df, current_date, self.freq):
             return 0.0
 
         # 2. 计算标杆
+        # MA250 / 近60日最高 在整个区间上预先计算一次，这里只按下标读取
         benchmark_price = None
-        close_series = history_df['close']
         
         if self.benchmark_type == 'ma250':
-            if len(close_series) >= 250:
-                benchmark_price = close_series.iloc[-250:].mean()
+            if len(history_df) >= 250:
+                benchmark_price = history_df.rolling(250)[history_df.end]
             else:
                 # 数据不足，无法计算 MA250，回退到基准金额
                 return self.base_amount
                 
         elif self.benchmark_type == 'max60':
-            if len(close_series) >= 1: # 只要有数据就能算 max
-                window = min(len(close_series), 60)
-                benchmark_price = close_series.iloc[-window:].max()
-            else:
-                return self.base_amount
+            # 只要有数据就能算 max (不足 60 天时取已有数据的最高点)
+            benchmark_price = history_df.rolling(60, how='max', min_periods=1)[history_df.end]
         else:
             # 未知类型
             return self.base_amount
@@ -340,7 +491,7 @@ class DynamicBenchmarkDropStrategy(BaseStrategy):
              return self.base_amount
 
         # 3. 计算跌幅并匹配档位
-        current_price = history_df.iloc[-1]['close']
+        current_price = history_df.value('close')
         
         if current_price >= benchmark_price:
             return self.base_amount
@@ -356,3 +507,81 @@ class DynamicBenchmarkDropStrategy(BaseStrategy):
                 break
         
         return self.base_amount * multiplier
+
+    def get_investment_amounts(self, history):
+        closes = history.close.astype(float)
+        if self.benchmark_type == 'ma250':
+            benchmark = history.rolling(250)
+        elif self.benchmark_type == 'max60':
+            benchmark = history.rolling(60, how='max', min_periods=1)
+        else:
+            # 未知类型
+            benchmark = np.full(history.size, np.nan)
+
+        # 标杆缺失 (NaN) 或现价不低于标杆时，比较结果为 False，维持基准金额
+        with np.errstate(invalid='ignore'):
+            drop_ratio = (benchmark - closes) / benchmark
+            below = closes < benchmark
+            # thresholds 是从大到小排序的，np.select 取第一个满足的档位
+            multiplier = np.select(
+                [drop_ratio > limit for limit, _ in self.thresholds],
+                [float(mult) for _, mult in self.thresholds],
+                default=1.0
+            )
+        amounts = np.where(below, self.base_amount * multiplier, float(self.base_amount))
+        return np.where(_investment_day_mask(history, self.freq), amounts, 0.0)
+
+# ==========================================
+# 按策略类型 (config.STRATEGY_TYPE / DRAW_STRATEGY_LIST 中的名称) 构造策略
+# 每个构造函数读取配置中对应的 *_PARAMS，返回 (策略实例, 策略名称)
+# ==========================================
+def _build_fixed(cfg):
+    params = cfg.FIXED_STRATEGY_PARAMS
+    strategy = FixedInvestment(amount=params['amount'], freq=params['freq'])
+    return strategy, f"Fixed_{params['freq']}_{params['amount']}"
+
+def _build_interval(cfg):
+    return IntervalFixedInvestment(intervals=cfg.INTERVAL_STRATEGY_PARAMS), "Interval_Custom"
+
+def _build_profit_ratio(cfg):
+    params = cfg.PROFIT_RATIO_STRATEGY_PARAMS
+    strategy = ProfitRatioStrategy(base_amount=params['base_amount'], thresholds=params['thresholds'])
+    return strategy, "Profit_Ratio_Dynamic"
+
+def _build_benchmark_drop(cfg):
+    params = cfg.BENCHMARK_DROP_STRATEGY_PARAMS
+    strategy = BenchmarkDropStrategy(
+        base_amount=params['base_amount'],
+        freq=params['freq'],
+        scale_factor=params['scale_factor']
+    )
+    return strategy, f"BenchmarkDrop_{params['freq']}_x{params['scale_factor']}"
+
+def _build_dynamic_benchmark(cfg):
+    params = cfg.DYNAMIC_BENCHMARK_STRATEGY_PARAMS
+    strategy = DynamicBenchmarkDropStrategy(
+        base_amount=params['base_amount'],
+        freq=params['freq'],
+        benchmark_type=params['benchmark_type'],
+        thresholds=params['thresholds']
+    )
+    return strategy, f"DynamicBenchmark_{params['benchmark_type']}"
+
+def _build_quadratic_ma(cfg):
+    params = cfg.QUADRATIC_MA_STRATEGY_PARAMS
+    strategy = QuadraticMAStrategy(
+        base_amount=params['base_amount'],
+        freq=params['freq'],
+        k_factor=params['k_factor'],
+        max_multiplier=params['max_multiplier']
+    )
+    return strategy, f"QuadraticMA_K{params['k_factor']}"
+
+STRATEGY_BUILDERS = {
+    'fixed': _build_fixed,
+    'interval': _build_interval,
+    'profit_ratio': _build_profit_ratio,
+    'benchmark_drop': _build_benchmark_drop,
+    'dynamic_benchmark': _build_dynamic_benchmark,
+    'quadratic_ma': _build_quadratic_ma,
+}
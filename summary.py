@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+def calc_annualized_return(invested, value, years):
+    """
+    年化收益率 (CAGR, %)，支持 numpy 数组批量计算
+    公式: (End_Value / Start_Value) ^ (1/n) - 1
+    注意: 这里把 total_invested 当作期初一次性投入 (对定投偏保守)
+    :param invested: 总投入
+    :param value: 期末市值
+    :param years: 持有年数
+    :return: 与 invested 同形状的年化收益率，投入/市值/年数非正或溢出时为 0
+    """
+    invested = np.asarray(invested, dtype=np.float64)
+    value = np.asarray(value, dtype=np.float64)
+    years = np.broadcast_to(np.asarray(years, dtype=np.float64), invested.shape)
+
+    valid = (invested > 0) & (value > 0) & (years > 0)
+    ratio = np.divide(value, invested, out=np.ones_like(invested), where=valid)
+    exponent = np.divide(1.0, years, out=np.zeros_like(invested), where=valid)
+    with np.errstate(over='ignore'):
+        annualized = (ratio ** exponent - 1) * 100
+    # 溢出 (持有时间极短) 时按 0 处理
+    return np.where(valid & np.isfinite(annualized), annualized, 0.0)
+
+def calc_annualized_return_vec(invested, value, days):
+    """
+    逐日年化收益率 (%)，用于收益曲线的悬停提示
+    :param invested: 每日总投入 (numpy 数组)
+    :param value: 每日市值 (numpy 数组)
+    :param days: 每日距首日的天数 (numpy 数组)
+    :return: 年化收益率数组; 未投入或不足 0.01 年时为 0，市值非正时为 -100
+    """
+    invested = np.asarray(invested, dtype=np.float64)
+    value = np.asarray(value, dtype=np.float64)
+    years = np.asarray(days, dtype=np.float64) / 365.25
+
+    # 开始阶段年数过小，避免除零和极端波动
+    active = (invested > 0) & (years >= 0.01)
+    valid = active & (value > 0)
+    ratio = np.divide(value, invested, out=np.ones_like(invested), where=valid)
+    exponent = np.divide(1.0, years, out=np.zeros_like(invested), where=valid)
+    with np.errstate(over='ignore'):
+        annualized = (ratio ** exponent - 1) * 100
+    # 溢出时按 0 处理 (与逐行计算时的异常分支一致)
+    annualized = np.where(np.isfinite(annualized), annualized, 0.0)
+
+    return np.where(valid, annualized, np.where(active, -100.0, 0.0))
+
+def build_comparison_summary(results, start_date, end_date):
+    """
+    汇总多策略回测结果
+    :param results: dict {strategy_name: df_result}
+    :return: 按收益率降序排列的汇总 DataFrame
+    """
+    # 年化按配置的回测区间计算
+    duration_days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days
+    years = duration_days / 365.25
+
+    names = list(results.keys())
+    invested = np.array([results[n]['total_invested'].iat[-1] for n in names], dtype=np.float64)
+    value = np.array([results[n]['final_value'].iat[-1] for n in names], dtype=np.float64)
+    profit = value - invested
+    ret_rate = np.divide(profit, invested, out=np.zeros_like(profit), where=invested > 0) * 100
+
+    summary_df = pd.DataFrame({
+        "Strategy": names,
+        "Total Invested": invested,
+        "Final Value": value,
+        "Profit": profit,
+        "Return Rate (%)": ret_rate,
+        "Annualized (%)": calc_annualized_return(invested, value, years)
+    })
+    # Sort by Return Rate descending
+    return summary_df.sort_values(by="Return Rate (%)", ascending=False)
@@ -1,7 +1,13 @@
+import numpy as np
 import pandas as pd
 import strategies
-from main import run_backtest
+import data_loader
+from main import run_backtest, _save_logs
+from main_v2 import run_portfolio
+from summary import build_comparison_summary
 import unittest
+import os
+import tempfile
 from datetime import datetime, timedelta
 
 class TestStockAnalysis(unittest.TestCase):
@@ -91,6 +97,136 @@ class TestStockAnalysis(unittest.TestCase):
         
         self.assertEqual(result['total_invested'], 1800)
 
+    def test_legacy_dataframe_strategy(self):
+        """
+        测试未声明 accepts_history_view 的自定义策略仍然收到 DataFrame 切片
+        """
+        print("\nRunning Test: Legacy DataFrame Strategy")
+        df = self.create_dummy_data('constant')
+
+        class LegacyStrategy(strategies.BaseStrategy):
+            def get_investment_amount(self, history_df, current_date):
+                # 旧式策略直接使用 DataFrame 接口
+                assert isinstance(history_df, pd.DataFrame)
+                assert history_df.iloc[-1]['date'] == current_date
+                return 100 if len(history_df) % 10 == 1 else 0.0
+
+        result = run_backtest("TEST_LEGACY", '2020-01-01', '2020-01-31', LegacyStrategy(), "Legacy", df=df)
+
+        self.assertIsNotNone(result)
+        # 31 天中第 1, 11, 21, 31 天投资
+        self.assertEqual(result['total_invested'], 400)
+
+    def test_vectorized_amounts_match_daily(self):
+        """
+        测试内置策略的向量化金额与逐日调用 get_investment_amount 的结果一致
+        """
+        print("\nRunning Test: Vectorized Amounts")
+        df = self.create_dummy_data('linear_down', days=400)
+        df['profit_ratio'] = np.linspace(0, 0.1, len(df))
+        history = strategies.HistoryView(df)
+
+        thresholds = [(0.05, 1.05), (0.15, 1.3), (0.30, 2.0)]
+        cases = [
+            strategies.FixedInvestment(amount=100, freq='W'),
+            strategies.IntervalFixedInvestment([
+                {'start': '2020-01-01', 'end': '2020-06-30', 'amount': 100, 'freq': 'M'},
+                {'start': '2020-07-01', 'end': '2020-12-31', 'amount': 200, 'freq': 'D'}
+            ]),
+            strategies.ProfitRatioStrategy(base_amount=100, thresholds=[(0.01, 10), (0.05, 2)]),
+            strategies.BenchmarkDropStrategy(base_amount=100, freq='D', scale_factor=2.0),
+            strategies.QuadraticMAStrategy(base_amount=100, freq='M'),
+            strategies.DynamicBenchmarkDropStrategy(base_amount=100, benchmark_type='ma250', thresholds=thresholds),
+            strategies.DynamicBenchmarkDropStrategy(base_amount=100, benchmark_type='max60', thresholds=thresholds),
+        ]
+        for strategy in cases:
+            vectorized = strategy.get_investment_amounts(history)
+            daily = strategies.BaseStrategy.get_investment_amounts(strategy, history)
+            np.testing.assert_allclose(vectorized, daily, err_msg=type(strategy).__name__)
+
+    def test_comparison_summary(self):
+        """
+        测试汇总表: 收益率、年化收益与排序
+        """
+        print("\nRunning Test: Comparison Summary")
+        dates = pd.to_datetime(['2020-01-01', '2021-01-01'])
+        results = {
+            'Flat': pd.DataFrame({'date': dates, 'total_invested': [100.0, 200.0], 'final_value': [100.0, 200.0]}),
+            'Up': pd.DataFrame({'date': dates, 'total_invested': [100.0, 200.0], 'final_value': [100.0, 400.0]}),
+            'Empty': pd.DataFrame({'date': dates, 'total_invested': [0.0, 0.0], 'final_value': [0.0, 0.0]}),
+        }
+        summary_df = build_comparison_summary(results, '2020-01-01', '2021-12-31')
+
+        self.assertEqual(list(summary_df['Strategy']), ['Up', 'Flat', 'Empty'])
+        up = summary_df.iloc[0]
+        self.assertAlmostEqual(up['Return Rate (%)'], 100.0)
+        years = 730 / 365.25
+        self.assertAlmostEqual(up['Annualized (%)'], (2 ** (1 / years) - 1) * 100)
+        self.assertEqual(summary_df.iloc[2]['Annualized (%)'], 0.0)
+
+    def test_portfolio(self):
+        """
+        测试多标的回测: 并行与顺序执行结果一致，缺失数据的标的被跳过
+        """
+        print("\nRunning Test: Portfolio")
+        data = {
+            'FLAT': self.create_dummy_data('constant'),
+            'UP': self.create_dummy_data('linear_up'),
+            'MISSING': None,
+        }
+        factory = lambda: strategies.FixedInvestment(amount=100, freq='W')
+        serial = run_portfolio(list(data), '2020-01-01', '2020-12-31', factory, max_workers=1, data=data)
+        parallel = run_portfolio(list(data), '2020-01-01', '2020-12-31', factory, max_workers=2, data=data)
+
+        self.assertEqual(list(serial), ['FLAT', 'UP'])
+        self.assertEqual(list(parallel), ['FLAT', 'UP'])
+        for symbol in serial:
+            pd.testing.assert_frame_equal(serial[symbol], parallel[symbol])
+        self.assertAlmostEqual(serial['FLAT']['return_rate'].iat[-1], 0.0, places=4)
+        self.assertGreater(serial['UP']['return_rate'].iat[-1], 0)
+
+    def test_save_logs_matches_to_csv(self):
+        """
+        测试小日志的 csv 模块写出与 DataFrame.to_csv 字节一致 (含 float32 列、object 列与缺失值)
+        """
+        print("\nRunning Test: Save Logs")
+        logs = {
+            'date': pd.date_range('2020-01-01', periods=5).to_numpy(),
+            'close': np.array([0.1, 1 / 3, 2.5, 10.0, 7.7], dtype=np.float32),
+            'shares': np.array([np.nan, 0.5, 1 / 3, np.nan, 2.0], dtype=np.float32),
+            'invest': np.array([100.0, 0.0, 1 / 3, 50.0, np.nan]),
+            'cyq': np.array([1.5, pd.NA, None, np.float64(0.25), 'x'], dtype=object),
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fast_path = os.path.join(tmp_dir, 'fast.csv')
+            pandas_path = os.path.join(tmp_dir, 'pandas.csv')
+            _save_logs(logs, fast_path)
+            pd.DataFrame(logs).to_csv(pandas_path, index=False)
+            with open(fast_path) as f_fast, open(pandas_path) as f_pandas:
+                self.assertEqual(f_fast.read(), f_pandas.read())
+
+    def test_merge_incremental(self):
+        """
+        测试增量合并: 缓存最后一天的盘中临时数据被新数据覆盖；此前的收盘价不一致 (除权) 时返回 None
+        """
+        print("\nRunning Test: Merge Incremental")
+        df_cached = self.create_dummy_data('linear_up', days=20)
+        df_new = self.create_dummy_data('linear_up', days=24).iloc[14:].reset_index(drop=True)
+        # 缓存最后一天 (2020-01-20) 为盘中数据，收盘价与最终值不同
+        df_cached.loc[df_cached.index[-1], 'close'] += 0.5
+
+        merged = data_loader._merge_incremental(df_cached, df_new)
+        self.assertIsNotNone(merged)
+        self.assertEqual(len(merged), 24)
+        self.assertTrue(merged['date'].is_monotonic_increasing)
+        final_close = df_new.loc[df_new['date'] == df_cached['date'].iat[-1], 'close'].iat[0]
+        self.assertAlmostEqual(merged.loc[19, 'close'], final_close)
+
+        # 前复权价格整体变化: 需要重新获取全部历史
+        df_adjusted = df_new.copy()
+        df_adjusted['close'] *= 0.9
+        self.assertIsNone(data_loader._merge_incremental(df_cached, df_adjusted))
+
 
 if __name__ == '__main__':
     unittest.main()
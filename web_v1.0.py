@@ -4,8 +4,8 @@ import plotly.graph_objects as go
 import pandas as pd
 import data_loader
 import config
-from main_v2 import run_backtest_v2
-from main_v4_plotly import create_strategy
+from main_v2 import run_backtests, create_strategy
+from summary import calc_annualized_return_vec
 import datetime
 import os
 import json
@@ -19,13 +19,20 @@ server = app.server
 # Cache Logic
 # ==========================================
 CACHE_FILE = "data/web_input_cache"
+# 进程内缓存 (mtime, 列表)，文件未变化时不重复读取解析
+_input_cache = None
 
 def load_input_cache():
+    global _input_cache
     if not os.path.exists(CACHE_FILE):
         return []
     try:
-        with open(CACHE_FILE, 'r') as f:
-            return json.load(f)
+        mtime = os.path.getmtime(CACHE_FILE)
+        if _input_cache is None or _input_cache[0] != mtime:
+            with open(CACHE_FILE, 'r') as f:
+                _input_cache = (mtime, json.load(f))
+        # 返回副本，调用方会原地修改列表
+        return list(_input_cache[1])
     except:
         return []
 
@@ -114,19 +121,21 @@ def generate_strategy_figure(symbol, start_date, end_date):
     
     print(f"Running strategies for {symbol}: {start_date} to {end_date}")
 
-    # Run Backtests
+    # Run Backtests (data is loaded and filtered once; a failing strategy is skipped by run_backtests)
+    strategy_list = []
     for strat_type in draw_list:
         try:
             strategy, strategy_name = create_strategy(strat_type)
-            if strategy is None:
-                continue
-                
-            df_result = run_backtest_v2(symbol, str(start_date), str(end_date), strategy, strategy_name)
-            
-            if df_result is not None and not df_result.empty:
-                results[strategy_name] = df_result
+            if strategy is not None:
+                strategy_list.append((strategy, strategy_name))
         except Exception as e:
-            print(f"Error executing strategy {strat_type}: {e}")
+            print(f"Error creating strategy {strat_type}: {e}")
+
+    try:
+        # Run in-process: forking a pool inside the threaded Dash server is unsafe and slower here
+        results = run_backtests(symbol, str(start_date), str(end_date), strategy_list, max_workers=1)
+    except Exception as e:
+        print(f"Error executing strategies for {symbol}: {e}")
 
     # Plotting
     fig = go.Figure()
@@ -145,35 +154,17 @@ def generate_strategy_figure(symbol, start_date, end_date):
         # Check if df is empty or too short
         if df.empty: continue
             
-        first_date = df['date'].iloc[0]
-        
-        def calc_annualized(row):
-            invested = row['total_invested']
-            value = row['final_value']
-            
-            if invested <= 0:
-                return 0.0
-                
-            days_diff = (row['date'] - first_date).days
-            years_diff = days_diff / 365.25
-            
-            if years_diff < 0.01: 
-                return 0.0
-                
-            try:
-                if value <= 0: return -100.0
-                return ((value / invested) ** (1 / years_diff) - 1) * 100
-            except:
-                return 0.0
+        days_diff = (df['date'] - df['date'].iat[0]).dt.days.to_numpy()
 
         df_plot = df.copy()
-        df_plot['annualized_hover'] = df_plot.apply(calc_annualized, axis=1)
+        df_plot['annualized_hover'] = calc_annualized_return_vec(
+            df_plot['total_invested'].to_numpy(), df_plot['final_value'].to_numpy(), days_diff)
 
-        fig.add_trace(go.Scatter(
+        fig.add_trace(go.Scattergl(
             x=df_plot['date'],
             y=df_plot['return_rate'],
             mode='lines',
-            name=f"{name} (Final: {df_plot.iloc[-1]['return_rate']:.2f}%)",
+            name=f"{name} (Final: {df_plot['return_rate'].iat[-1]:.2f}%)",
             customdata=df_plot[['total_invested', 'annualized_hover', 'final_value']],
             hovertemplate=(
                 "<b>Return: %{y:.2f}%</b><br>" +
@@ -199,11 +190,14 @@ def generate_strategy_figure(symbol, start_date, end_date):
             orientation="h", # Horizontal layout
             yanchor="bottom", y=1.02, # Position above the chart
             xanchor="center", x=0.5, # Center alignment
-            bgcolor="rgba(255, 255, 255, 0.8)"
+            bgcolor="rgba(255, 255, 255, 0.8)",
+            uirevision=symbol # Keep legend toggles while the symbol stays the same
         ),
         template="plotly_white",
         margin=dict(l=40, r=40, t=80, b=40),
-        height=500
+        height=500,
+        # Callbacks replace this figure in place: keep zoom only while the selected range is unchanged
+        uirevision=f"{symbol}|{start_date}|{end_date}"
     )
     return fig
 